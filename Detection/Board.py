@@ -57,6 +57,103 @@ class Board:
         
         return False, None
     
+def move_relocations(board: chess.Board, move: chess.Move):
+    """
+    Physical piece relocations needed to play `move` on `board` (the position
+    before the move), as (start, end, piece symbol) for the gantry. Captured
+    pieces go to "RACK". Castling moves the rook too and en passant removes
+    the pawn that is not on the destination square.
+    """
+    def relocation(start, end):
+        start_name = chess.square_name(start).upper()
+        end_name = end if isinstance(end, str) else chess.square_name(end).upper()
+        return (start_name, end_name, board.piece_at(start).symbol())
+
+    relocations = []
+    if board.is_en_passant(move):
+        captured = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+        relocations.append(relocation(captured, "RACK"))
+    elif board.is_capture(move):
+        relocations.append(relocation(move.to_square, "RACK"))
+
+    relocations.append(relocation(move.from_square, move.to_square))
+
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if board.is_kingside_castling(move):
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        relocations.append(relocation(rook_from, rook_to))
+
+    return relocations
+
+def undo_relocations(board: chess.Board, move: chess.Move):
+    """
+    Relocations that take `move` back on the physical board (`board` is the
+    position before the move): the move_relocations legs reversed, last
+    first, so captured pieces come back out of the rack ("RACK" as start).
+    """
+    return [(end, start, piece) for start, end, piece in reversed(move_relocations(board, move))]
+
+def follow_position(history: chess.Board, fen, last_move=None):
+    """
+    The server's new position `fen`, keeping the move stack of `history`
+    when `last_move` (UCI) leads there from it, so a later undo can be taken
+    back from the cached history. Otherwise a fresh board from the FEN.
+    """
+    if history.fen() == fen:
+        return history
+    if last_move is not None:
+        move = chess.Move.from_uci(last_move)
+        if move in history.legal_moves:
+            board = history.copy()
+            board.push(move)
+            if board.fen() == fen:
+                return board
+    return chess.Board(fen)
+
+def take_back(history: chess.Board, fen, undone):
+    """
+    The server undid `undone` (UCI) and is now at `fen`. Returns the new
+    position and the gantry relocations that undo the move, taken from the
+    cached history when it ends with that move, else from the server's FEN
+    (the position before the move). Relocations are None if the move fits
+    neither; the caller falls back to a full restore.
+    """
+    move = chess.Move.from_uci(undone)
+    target = chess.Board(fen)
+    if history.move_stack and history.peek() == move:
+        before = history.copy()
+        before.pop()
+        if before.board_fen() == target.board_fen():
+            return before, undo_relocations(before, move)
+    if move in target.legal_moves:
+        return target, undo_relocations(target, move)
+    return target, None
+
+def square_name(row, col):
+    """Grid index (row = rank - 1, col = file) to a square name like 'E4'."""
+    return f"{chr(65 + col)}{row + 1}"
+
+def find_misplacement(expected, observed):
+    """
+    Compare the color grid the gantry should have produced with the one the
+    camera sees. Returns None if they match, ("nudge", expected_sq,
+    observed_sq) if exactly one piece landed on the wrong square, and
+    ("home", [differing squares]) for anything else.
+    """
+    diffs = get_board_diffs(expected, observed)
+    if not diffs:
+        return None
+
+    missing = [(x, y, a) for x, y, a, b in diffs if a != '_' and b == '_']
+    extra = [(x, y, b) for x, y, a, b in diffs if a == '_' and b != '_']
+    if len(diffs) == 2 and len(missing) == 1 and len(extra) == 1 and missing[0][2] == extra[0][2]:
+        return ("nudge", square_name(missing[0][0], missing[0][1]), square_name(extra[0][0], extra[0][1]))
+
+    return ("home", [square_name(x, y) for x, y, _, _ in diffs])
+
 def empty_board():
     return [['_' for _ in range(8)] for _ in range(8)]
 
@@ -19,3 +19,32 @@ def test_set_board():
     b.set_board(c)
 
     assert(b.get_last_valid_board() == Board.new_board())
+
+def test_find_misplacement():
+    expected = Board.new_board()
+    expected[1][4] = '_'
+    expected[3][4] = 'W'   # e2e4 played by the gantry
+    assert(Board.find_misplacement(expected, [row[:] for row in expected]) is None)
+
+    observed = [row[:] for row in expected]
+    observed[3][4] = '_'
+    observed[4][4] = 'W'   # landed one square short... or long
+    assert(Board.find_misplacement(expected, observed) == ("nudge", "E4", "E5"))
+
+    observed[0][0] = '_'
+    assert(Board.find_misplacement(expected, observed)[0] == "home")
+
+def test_take_back():
+    history = chess.Board()
+    for uci in ["e2e4", "d7d5"]:
+        history.push_uci(uci)
+    after = Board.follow_position(history, "rnbqkbnr/ppp1pppp/8/3P4/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 2", "e4d5")
+    assert(len(after.move_stack) == 3)
+
+    before, relocations = Board.take_back(after, history.fen(), "e4d5")
+    assert(before.move_stack == history.move_stack)
+    assert(relocations == [("D5", "E4", "P"), ("RACK", "D5", "p")])
+
+    # No cached history: the server's FEN is the position before the move
+    before, relocations = Board.take_back(chess.Board(after.fen()), history.fen(), "e4d5")
+    assert(relocations == [("D5", "E4", "P"), ("RACK", "D5", "p")])
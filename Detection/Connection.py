@@ -1,21 +1,72 @@
 
+import os
+import importlib.util
 import socketio
 import threading
 
 SERVER_URL = "http://localhost:5000"
-sio = socketio.Client()
+# "msgpack" if the chess server runs with SERIALIZER=msgpack (needs msgpack)
+SERIALIZER = os.environ.get("SERIALIZER", "json")
+sio = socketio.Client(serializer="msgpack" if SERIALIZER == "msgpack" else "default")
 
 
+import json
 import requests
 import chess
 
+import Board as board_module  # module; `Board` below is the shared Board instance
+import Tracing
+
+# Move encoding shared with the chess server (app/wire.py), loaded by path so
+# the rest of app/ (app.py, room_store.py, ...) can't shadow modules here
+_wire_spec = importlib.util.spec_from_file_location(
+    "wire", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "wire.py"))
+wire = importlib.util.module_from_spec(_wire_spec)
+_wire_spec.loader.exec_module(wire)
+
 GANTRY_SERVER_URL = "http://172.17.88.122:3000"   # change to your server IP
 
-def send_move_to_gantry(start, end, is_capture):
+# (FEN, move) the server last refused: not sent again from that position
+rejected = None
+
+# False until the first board_update after (re)connecting, which only
+# tells us where the game is: the physical board is assumed to match it
+synced = False
+
+def send_move_to_gantry(start, end, is_capture, piece=None, trace=None):
     print("Request:", is_capture)
-    r = requests.get(f"{GANTRY_SERVER_URL}/move", params={"start": start, "end": end, "capture": is_capture})
+    params = {"start": start, "end": end, "capture": is_capture}
+    if piece is not None:
+        params["piece"] = piece
+    if trace is not None:
+        params["trace"] = json.dumps(trace)
+    r = requests.get(f"{GANTRY_SERVER_URL}/move", params=params)
+    print("Server replied:", r.text)
+
+def send_job_to_gantry(relocations, trace=None):
+    moves = [{"start": start, "end": end, "piece": piece} for start, end, piece in relocations]
+    print("Job request:", moves)
+    job = {"moves": moves}
+    if trace is not None:
+        job["trace"] = trace
+    r = requests.post(f"{GANTRY_SERVER_URL}/job", json=job)
     print("Server replied:", r.text)
 
+def send_restore_to_gantry(current_fen, target_fen):
+    print("Restore request:", current_fen, "->", target_fen)
+    r = requests.post(f"{GANTRY_SERVER_URL}/restore", json={"current": current_fen, "target": target_fen})
+    print("Server replied:", r.text)
+
+def send_home_to_gantry():
+    print("Home request")
+    r = requests.get(f"{GANTRY_SERVER_URL}/home")
+    print("Server replied:", r.text)
+
+def send_correction_to_gantry(expected, observed):
+    """A piece meant for `expected` was seen on `observed`: carry it over."""
+    piece = Board.chess.piece_at(chess.parse_square(expected.lower()))
+    send_job_to_gantry([(observed, expected, piece.symbol() if piece else None)])
+
 def init_connection(board):
     global room
     global Board
@@ -30,7 +81,7 @@ def init_connection(board):
 
     # Ask which room to join
     room = input("🏠 Enter room name (e.g., game1, test, etc.): ").strip() or "default"
-    sio.emit("join", {"room": room})
+    sio.emit("join", {"room": room, "payload": "fen"})
     print(f"📥 Joined room: {room}")
 
 # --------------------
@@ -39,8 +90,9 @@ def init_connection(board):
 
 @sio.event
 def connect():
-    global connected
+    global connected, synced
     connected = True
+    synced = False
     print("✅ Connected to chess server.")
 
 
@@ -63,7 +115,7 @@ def on_color(data):
 
 @sio.on("board_update")
 def on_board_update(data):
-    global current_turn
+    global current_turn, synced
     current_turn = data.get("turn", "Unknown")
 
     fen = data.get("fen")
@@ -74,28 +126,105 @@ def on_board_update(data):
     print(f"\n♟ Board updated — {current_turn}'s turn.")
     print(f"FEN: {fen}")
 
-    Board.set_board(chess.Board(fen))
+    # First update after joining (maybe mid-game): take the server's
+    # position as it is, there is no earlier local position to move from
+    if not synced:
+        synced = True
+        Board.set_board(chess.Board(fen))
+        return
+
+    previous = Board.chess
+    last_move = wire.read_move(data.get("last_move"))
+    undone = wire.read_move(data.get("undo"))
+
+    # Undo: reverse the undone move's relocations as one gantry job (a
+    # captured piece comes back out of the rack), using the cached history.
+    if undone is not None:
+        new, relocations = board_module.take_back(previous, fen, undone.uci())
+        Board.set_board(new)
+        if relocations is not None:
+            send_job_to_gantry(relocations)
+        elif previous.board_fen() != new.board_fen():
+            send_restore_to_gantry(previous.board_fen(), new.board_fen())
+        return
+
+    new = board_module.follow_position(previous, fen, last_move.uci() if last_move else None)
+    Board.set_board(new)
+
+    # Reset: have the gantry set the physical board up again, pulling
+    # pieces back from the capture rack. Other updates without a move
+    # only resync the local board.
+    if last_move is None:
+        if data.get("reset") and previous.board_fen() != new.board_fen():
+            send_restore_to_gantry(previous.board_fen(), new.board_fen())
+        return
     
     if (data.get("turn") == player_color):
-        uci_move = data.get("last_move").upper()
+        trace = Tracing.stamp(data.get("trace"), "board_update")
+        uci_move = last_move.uci().upper()
         capture = bool(data.get("capture"))
         print(capture)
 
-        send_move_to_gantry(uci_move[0:2], uci_move[2:4], capture)
+        # Castling and en passant need more than one piece moved: send them
+        # as a single gantry job so the Pi can order the legs itself.
+        move = chess.Move.from_uci(uci_move.lower())
+        if previous.is_castling(move) or previous.is_en_passant(move):
+            send_job_to_gantry(board_module.move_relocations(previous, move), trace)
+        elif capture:
+            captured = previous.piece_at(move.to_square)
+            send_move_to_gantry(uci_move[0:2], uci_move[2:4], capture,
+                                captured.symbol() if captured else None, trace)
+        else:
+            send_move_to_gantry(uci_move[0:2], uci_move[2:4], capture, trace=trace)
     
 
 
+@sio.on("move_rejected")
+def on_move_rejected(data):
+    global rejected
+    move = f"{data.get('from')}{data.get('to')}"
+    print(f"⛔ Move {move} rejected by server: {data.get('reason')}")
+    fen = data.get("fen")
+    if fen is None:
+        return
+
+    # Take the move back locally so the board matches the server again
+    board = Board.chess
+    if board.move_stack and board.peek().uci()[:4] == move.lower():
+        board = board.copy()
+        board.pop()
+    if board.fen() != fen:
+        board = chess.Board(fen)
+    Board.set_board(board)
+    rejected = (fen, move.lower())
+
+
 # --------------------
 # Command Functions
 # --------------------
 
-def send_move(uci):
+def send_move(uci, frame_time=None):
+    """Send a move the camera saw (frame_time: when its frame was read, for the trace)."""
     if len(uci) < 4:
         print("❗ Invalid format. Use like: move e2e4")
         return
+    # The camera keeps seeing a refused move until the piece is put back:
+    # revert it locally again instead of resending it every frame
+    if rejected is not None and Board.chess.move_stack and uci[:4] == rejected[1]:
+        before = Board.chess.copy()
+        before.pop()
+        if before.fen() == rejected[0]:
+            Board.set_board(before)
+            return
     from_sq, to_sq = uci[:2], uci[2:4]
-    sio.emit("move", {"room": room, "from": from_sq, "to": to_sq})
-    print(f"➡️ Sent move: {from_sq}->{to_sq}")
+    trace = Tracing.new_trace(frame_time)
+    if SERIALIZER == "msgpack":
+        payload = {"room": room, "move": wire.pack_move(chess.Move.from_uci(uci))}
+    else:
+        payload = {"room": room, "from": from_sq, "to": to_sq}
+    payload["trace"] = Tracing.stamp(trace, "sent")
+    sio.emit("move", payload)
+    print(f"➡️ Sent move: {from_sq}->{to_sq} (trace {trace['id']})")
 
 
 def send_undo():
@@ -1,16 +1,43 @@
 # server.py — Socket.IO server for smart chessboard (Python)
 
+import json
+import os
 import socketio
 from aiohttp import web
 import threading
+import queue
+
+import Tracing
+
+# "msgpack" sends binary frames (needs msgpack); the Pi must use the same
+SERIALIZER = os.environ.get("SERIALIZER", "json")
 
 # Create Socket.IO server
-sio = socketio.AsyncServer(cors_allowed_origins='*')
+sio = socketio.AsyncServer(cors_allowed_origins='*',
+                           serializer="msgpack" if SERIALIZER == "msgpack" else "default")
 app = web.Application()
 sio.attach(app)
 
 PORT = 3000  # Must match the Pi's SOCKETIO_SERVER_URL port
 
+# Finished gantry jobs, for the camera to verify (see Main.py). Bounded: when
+# nothing is verifying (no camera loop running) only the latest are kept.
+finished_jobs = queue.Queue(maxsize=16)
+
+def _job_finished(kind, data):
+    if data.get("trace") is not None:
+        Tracing.finish(data["trace"])
+    job = {"kind": kind, **data}
+    while True:
+        try:
+            finished_jobs.put_nowait(job)
+            return
+        except queue.Full:
+            try:
+                finished_jobs.get_nowait()  # drop the oldest
+            except queue.Empty:
+                pass
+
 
 # ---- HTTP ROUTES ----
 
@@ -27,6 +54,8 @@ async def move_handler(request):
     start = request.rel_url.query.get("start")
     end   = request.rel_url.query.get("end")
     capture   = request.rel_url.query.get("capture")
+    piece     = request.rel_url.query.get("piece")
+    trace     = request.rel_url.query.get("trace")
 
     if not start or not end:
         return web.Response(
@@ -36,17 +65,93 @@ async def move_handler(request):
 
     start = start.upper().strip()
     end   = end.upper().strip()
+    capture = str(capture).lower() == "true"
 
     print(f"[HTTP] Request to move: {start} -> {end}")
 
+    payload = {"start": start, "end": end, "capture": capture, "piece": piece}
+    if trace:
+        try:
+            payload["trace"] = Tracing.stamp(json.loads(trace), "gantry_server")
+        except ValueError:
+            pass  # a bad trace must not cost the move
+
     # Broadcast to all connected Pis
-    await sio.emit("move_piece", {"start": start, "end": end, "capture": capture})
+    await sio.emit("move_piece", payload)
 
     return web.Response(text=f"Emitted move_piece: {start} -> {end}, capture: {capture}")
 
 app.router.add_get("/move", move_handler)
 
 
+# Job endpoint (several relocations executed as one gantry batch):
+#   POST /job  {"moves": [{"start": "E1", "end": "G1"}, {"start": "H1", "end": "F1"}]}
+async def job_handler(request):
+    try:
+        data = await request.json()
+        moves = [{"start": str(m["start"]).upper().strip(), "end": str(m["end"]).upper().strip(),
+                  "piece": m.get("piece")}
+                 for m in data["moves"]]
+    except Exception:
+        return web.Response(
+            status=400,
+            text='Usage: POST /job {"moves": [{"start": "E1", "end": "G1"}, ...]}'
+        )
+
+    print(f"[HTTP] Request for job: {moves}")
+
+    payload = {"moves": moves}
+    if data.get("trace") is not None:
+        payload["trace"] = Tracing.stamp(data["trace"], "gantry_server")
+
+    # Broadcast to all connected Pis
+    await sio.emit("move_job", payload)
+
+    return web.Response(text=f"Emitted move_job: {len(moves)} move(s)")
+
+app.router.add_post("/job", job_handler)
+
+
+# Restore endpoint (set the physical board up to match a position):
+#   POST /restore  {"current": "<board FEN>", "target": "<board FEN>"}
+async def restore_handler(request):
+    try:
+        data = await request.json()
+        current = str(data["current"]).strip()
+        target = str(data["target"]).strip()
+    except Exception:
+        return web.Response(
+            status=400,
+            text='Usage: POST /restore {"current": "<FEN>", "target": "<FEN>"}'
+        )
+
+    print(f"[HTTP] Request to restore: {current} -> {target}")
+
+    # Broadcast to all connected Pis
+    await sio.emit("restore_position", {"current": current, "target": target})
+
+    return web.Response(text=f"Emitted restore_position: {target}")
+
+app.router.add_post("/restore", restore_handler)
+
+
+# Home / abort endpoints:
+#   http://<IP>:3000/home   (queued after any pending moves)
+#   http://<IP>:3000/abort  (drops pending moves, stops the current one)
+async def home_handler(request):
+    print("[HTTP] Request to home")
+    await sio.emit("home", {})
+    return web.Response(text="Emitted home")
+
+async def abort_handler(request):
+    print("[HTTP] Request to abort")
+    await sio.emit("abort", {})
+    return web.Response(text="Emitted abort")
+
+app.router.add_get("/home", home_handler)
+app.router.add_get("/abort", abort_handler)
+
+
 # ---- SOCKET.IO EVENTS ----
 
 @sio.event
@@ -57,6 +162,35 @@ async def connect(sid, environ):
 @sio.event
 async def move_piece_done(sid, data):
     print("[IO] move_piece_done from Pi:", data)
+    _job_finished("move_piece", data)
+
+
+@sio.event
+async def move_piece_queued(sid, data):
+    print("[IO] move_piece_queued from Pi:", data)
+
+
+@sio.event
+async def move_piece_progress(sid, data):
+    print(f"[IO] Job {data.get('job_id')} ({data.get('kind')}): "
+          f"{data.get('percent')}% done, ETA {data.get('eta_s')} s")
+
+
+@sio.event
+async def home_done(sid, data):
+    print("[IO] home_done from Pi:", data)
+
+
+@sio.event
+async def move_job_done(sid, data):
+    print("[IO] move_job_done from Pi:", data)
+    _job_finished("move_job", data)
+
+
+@sio.event
+async def restore_position_done(sid, data):
+    print("[IO] restore_position_done from Pi:", data)
+    _job_finished("restore_position", data)
 
 
 @sio.event
@@ -4,6 +4,8 @@ import PieceDetection as pd
 import Board
 import time
 import Gantry_server
+import Verification
+import queue
 
 import Connection
 
@@ -30,6 +32,8 @@ def main():
 
     server_thread = Gantry_server.start_server_in_thread()
 
+    verifier = Verification.PlacementVerifier()
+
     while True:
         keypress = cv2.waitKey(1) & 0xFF
         if keypress == ord('q'):
@@ -46,6 +50,7 @@ def main():
             print(f"Threshold: {pd.BLACK_RATIO}")
 
         ret, frame = cap.read()
+        frame_time = time.time()
         if not ret:
             print("Error: Could not read frame from camera. Exiting...")
             break
@@ -71,10 +76,35 @@ def main():
 
         print(new_board)
 
-        ret, move = board.validate_board_change(new_board)
-        if (ret):
-            print("Valid Move!")
-            Connection.send_move(move)
+        # Gantry finished a job: check it did what it was told before
+        # reading the board as a player move again
+        try:
+            verifier.start(Gantry_server.finished_jobs.get_nowait())
+        except queue.Empty:
+            pass
+
+        if verifier.job is not None:
+            result = verifier.observe(new_board, board.get_last_valid_board())
+            if result is None:
+                pass
+            elif result[0] == "ok":
+                print("Gantry move verified.")
+            elif result[0] == "nudge":
+                print(f"Piece for {result[1]} landed on {result[2]}, moving it over.")
+                Connection.send_correction_to_gantry(result[1], result[2])
+            elif not result[1]:
+                print("Gantry move could not be verified in time. "
+                      "Homing — check the board and carriage position.")
+                Connection.send_home_to_gantry()
+            else:
+                print(f"Board does not match after gantry move ({', '.join(result[1])}). "
+                      "Homing — check the board and carriage position.")
+                Connection.send_home_to_gantry()
+        else:
+            ret, move = board.validate_board_change(new_board)
+            if (ret):
+                print("Valid Move!")
+                Connection.send_move(move, frame_time)
 
 
         cv2.imshow('Raw Camera Feed', raw_img)
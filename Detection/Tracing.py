@@ -0,0 +1,102 @@
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# Where the seconds of a move go, from the camera to the other board's
+# gantry. A move the camera detects gets a trace
+#     {"id": "...", "stamps": [["frame", t], ["detected", t], ...]}
+# that travels with it through every hop, each adding a stamp (time.time()):
+#   frame / detected / sent  Main + Connection.send_move (this board)
+#   server_received          app.py handle_move
+#   server_broadcast         app.py, board_update sent to the room
+#   board_update             Connection.on_board_update (other board)
+#   gantry_server            Gantry_server /move or /job
+#   pi_received / pi_start / pi_done   the Pi (queued, running, finished)
+#   done                     Gantry_server, move_piece_done / move_job_done
+# Gantry_server prints each finished trace and appends it to TRACE_FILE (one
+# JSON line per move) when that is set; then
+#     python Tracing.py traces.jsonl
+# prints p50 / p95 per hop. The stamps come from different machines: keep
+# their clocks synced (NTP), or hops between machines are off by the skew.
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+
+
+def new_trace(frame_time=None):
+    """A trace for a move just detected (frame_time: when its frame was read)."""
+    trace = {"id": uuid.uuid4().hex[:12], "stamps": []}
+    if frame_time is not None:
+        trace["stamps"].append(["frame", frame_time])
+    stamp(trace, "detected")
+    return trace
+
+
+def stamp(trace, stage):
+    """Record that `trace` reached `stage` now (ignores missing or malformed traces)."""
+    if isinstance(trace, dict) and isinstance(trace.get("stamps"), list):
+        trace["stamps"].append([stage, time.time()])
+    return trace
+
+
+def hops(trace):
+    """[(hop name, seconds)] between consecutive stamps."""
+    stamps = trace.get("stamps") or []
+    return [(f"{a} -> {b}", tb - ta) for (a, ta), (b, tb) in zip(stamps, stamps[1:])]
+
+
+def finish(trace, path=TRACE_FILE):
+    """The move reached the end of the line: print its breakdown and keep it."""
+    stamp(trace, "done")
+    stamps = trace["stamps"]
+    total = stamps[-1][1] - stamps[0][1]
+    print(f"[TRACE] {trace['id']}: {1000 * total:.0f} ms — "
+          + ", ".join(f"{hop} {1000 * s:.0f}" for hop, s in hops(trace)))
+    if path:
+        with open(path, "a") as f:
+            f.write(json.dumps(trace) + "\n")
+
+
+def load(path):
+    traces = []
+    with open(path) as f:
+        for line in f:
+            try:
+                traces.append(json.loads(line))
+            except ValueError:
+                pass  # torn last line
+    return traces
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(traces):
+    """p50 / p95 / max per hop (in the order hops first appear) and end to end."""
+    by_hop = {}
+    totals = []
+    for trace in traces:
+        for hop, s in hops(trace):
+            by_hop.setdefault(hop, []).append(s)
+        stamps = trace.get("stamps") or []
+        if len(stamps) > 1:
+            totals.append(stamps[-1][1] - stamps[0][1])
+
+    lines = [f"{len(traces)} moves traced", f"{'hop':<36} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"]
+    for hop, values in list(by_hop.items()) + [("end to end", totals)]:
+        if not values:
+            continue
+        values = sorted(values)
+        lines.append(f"{hop:<36} {len(values):>5} {1000 * statistics.median(values):>8.1f} "
+                     f"{1000 * _percentile(values, 0.95):>8.1f} {1000 * values[-1]:>8.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python Tracing.py traces.jsonl")
+        sys.exit(1)
+    print(report(load(sys.argv[1])))
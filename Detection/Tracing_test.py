@@ -0,0 +1,25 @@
+import json
+import Tracing
+
+def test_report(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    for i in range(20):
+        trace = {"id": str(i), "stamps": [["detected", 0.0], ["sent", 0.01 * (i + 1)], ["server_received", 0.5]]}
+        Tracing.finish(trace, path)
+        assert(trace["stamps"][-1][0] == "done")
+    with open(path, "a") as f:
+        f.write('{"id": "torn')
+    traces = Tracing.load(path)
+    assert(len(traces) == 20)
+    assert([hop for hop, _ in Tracing.hops(traces[0])][:2] == ["detected -> sent", "sent -> server_received"])
+
+    report = Tracing.report(traces)
+    row = next(line for line in report.splitlines() if line.startswith("detected -> sent"))
+    assert(row.split()[3:6] == ["20", "105.0", "200.0"])
+
+def test_stamp_ignores_bad_traces():
+    assert(Tracing.stamp(None, "sent") is None)
+    assert(Tracing.stamp("x", "sent") == "x")
+    trace = Tracing.new_trace(frame_time=1.0)
+    assert([s for s, _ in trace["stamps"]] == ["frame", "detected"])
+    json.dumps(trace)
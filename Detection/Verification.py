@@ -0,0 +1,95 @@
+import time
+
+import Board
+
+# After the gantry reports a finished move, check with the camera that the
+# board really looks like the position we asked for. The gantry has no
+# limit switches, so lost steps would otherwise go unnoticed and every
+# later move would be off by the same amount.
+#   • Wait for VERIFY_FRAMES identical detections before judging (the arm
+#     may still be settling, detection is noisy)
+#   • One piece on the wrong square -> carry it over ("nudge"), then check again
+#   • Anything else, or a nudge that did not help -> send the carriage home
+#     and ask for the board to be checked by hand
+#   • No verdict within VERIFY_TIMEOUT_S (the nudge's done event never came:
+#     Pi offline, job aborted, request failed; or the board never looked
+#     stable) -> give up the same way, so move detection resumes
+
+VERIFY_FRAMES = 3
+MAX_NUDGES = 1
+VERIFY_TIMEOUT_S = 30.0
+
+
+class PlacementVerifier:
+    def __init__(self, frames=VERIFY_FRAMES, max_nudges=MAX_NUDGES, timeout_s=VERIFY_TIMEOUT_S,
+                 clock=time.monotonic):
+        self.frames = frames
+        self.max_nudges = max_nudges
+        self.timeout_s = timeout_s
+        self.clock = clock
+        self.job = None         # done event being verified
+        self.waiting = False    # a nudge is on its way, wait for its done event
+        self.deadline = None    # give up at this clock() time
+        self.nudges = 0
+        self.last_seen = None
+        self.stable = 0
+
+    @property
+    def checking(self):
+        return self.job is not None and not self.waiting
+
+    def start(self, job):
+        """
+        A gantry job finished: verify the next stable detections. Jobs that
+        failed or were aborted are not verified (nothing to compare against).
+        """
+        if job.get("status", "ok") != "ok":
+            print(f"Gantry {job.get('kind')} ended with {job.get('status')}, not verifying.")
+            self.job = None
+            self.waiting = False
+            return
+        if not self.waiting:
+            self.nudges = 0
+        self.job = job
+        self.waiting = False
+        self.deadline = self.clock() + self.timeout_s
+        self.last_seen = None
+        self.stable = 0
+
+    def observe(self, observed, expected):
+        """
+        Feed one detection. Returns None while undecided, otherwise
+        ("ok",), ("nudge", expected_sq, observed_sq) or ("home", squares)
+        (no squares if it timed out).
+        """
+        if self.job is not None and self.clock() > self.deadline:
+            self.job = None
+            self.waiting = False
+            return ("home", [])
+        if not self.checking:
+            return None
+
+        if observed == self.last_seen:
+            self.stable += 1
+        else:
+            self.last_seen = [row[:] for row in observed]
+            self.stable = 1
+        if self.stable < self.frames:
+            return None
+
+        result = Board.find_misplacement(expected, observed)
+        if result is None:
+            self.job = None
+            return ("ok",)
+
+        if result[0] == "nudge" and self.nudges < self.max_nudges:
+            self.nudges += 1
+            self.waiting = True
+            self.deadline = self.clock() + self.timeout_s
+            return result
+
+        self.job = None
+        self.waiting = False
+        if result[0] == "nudge":
+            return ("home", [result[1], result[2]])
+        return result
@@ -0,0 +1,18 @@
+import Board
+import Verification
+
+def test_gives_up_when_nudge_never_finishes():
+    now = [0.0]
+    verifier = Verification.PlacementVerifier(frames=1, timeout_s=5, clock=lambda: now[0])
+    expected = Board.new_board()
+    observed = [row[:] for row in expected]
+    observed[1][0], observed[2][0] = '_', observed[1][0]   # one piece off by a square
+
+    verifier.start({"kind": "move_piece", "status": "ok"})
+    assert(verifier.observe(observed, expected)[0] == "nudge")
+    now[0] = 4.0
+    assert(verifier.observe(observed, expected) is None)      # still waiting for the nudge
+    now[0] = 6.0
+    assert(verifier.observe(observed, expected) == ("home", []))
+    assert(verifier.job is None and not verifier.waiting)
+    assert(verifier.observe(observed, expected) is None)
@@ -1,32 +1,337 @@
-from flask import Flask, render_template, request
+import os
+
+# Async worker, chosen before anything else is imported so eventlet/gevent
+# can patch the standard library first:
+#   python app.py                              development (debug, reloader)
+#   ASYNC_MODE=eventlet python app.py --prod   production (see README)
+ASYNC_MODE = os.environ.get("ASYNC_MODE") or None
+if ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+from collections import OrderedDict
+from flask import Flask, Response, abort, jsonify, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import chess
+import chess.pgn
 import chess.svg
+import datetime
+import gzip
+import json
 import random
+import threading
+import time
+
+import move_log as move_log_module
+import room_store
+import wire
+
+# Several server processes (behind a load balancer with sticky sessions)
+# share rooms through ROOM_STORE=redis://... and relay each other's
+# broadcasts through MESSAGE_QUEUE=redis://... (see README).
+ROOM_STORE = os.environ.get("ROOM_STORE", "memory")
+MESSAGE_QUEUE = os.environ.get("MESSAGE_QUEUE") or None
+
+# SERIALIZER=msgpack: binary Socket.IO frames and two-byte moves (see
+# wire.py). Every client has to be started with the same setting.
+SERIALIZER = os.environ.get("SERIALIZER", "json")
+
+# Room lifecycle: rooms nobody is connected to are evicted after
+# ROOM_IDLE_S without activity; at MAX_ROOMS the least recently used empty
+# room makes way for a new one, or the join is refused. Evicted and reset
+# games are appended to ARCHIVE_FILE if set (.pgn: PGN, else JSON lines of
+# UCI moves).
+ROOM_IDLE_S = float(os.environ.get("ROOM_IDLE_S", 1800))
+MAX_ROOMS = int(os.environ.get("MAX_ROOMS", 10000))
+ARCHIVE_FILE = os.environ.get("ARCHIVE_FILE") or None
+SWEEP_INTERVAL_S = 60
+
+# With MOVE_LOG_DIR set, every room's moves are appended to a log there
+# (see move_log.py) and a room is rebuilt from it the first time it is used
+# after a restart. Several processes must share the same directory.
+MOVE_LOG_DIR = os.environ.get("MOVE_LOG_DIR") or None
 
 app = Flask(__name__)
-socketio = SocketIO(app)
+socketio = SocketIO(app, async_mode=ASYNC_MODE, message_queue=MESSAGE_QUEUE,
+                    serializer=wire.socketio_serializer(SERIALIZER))
+
+# Game rooms by room_id (see room_store.py). Handlers run concurrently
+# (threads, green threads or other processes): `with rooms.room(room_id)`
+# holds that room's lock, so a move is checked, pushed and broadcast
+# before the next one in that room starts.
+def _offload():
+    """How to run a blocking call (fsync) in a real OS thread for ASYNC_MODE."""
+    if ASYNC_MODE == "eventlet":
+        from eventlet import tpool
+        return tpool.execute
+    if ASYNC_MODE == "gevent":
+        import gevent
+        return lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+    return None  # threading: the fsync thread is a real thread already
+
+
+move_log = move_log_module.MoveLog(MOVE_LOG_DIR, offload=_offload()) if MOVE_LOG_DIR else None
+
+
+def load_room(room_id):
+    """Rebuild a room from its move log (first use after a restart)."""
+    replayed = move_log.replay(room_id)
+    if replayed is None:
+        return None
+    room = room_store.new_room()
+    room["board"], room["last_move"] = replayed
+    room["touched"] = move_log.modified(room_id)
+    print(f"Recovered room {room_id} ({len(room['board'].move_stack)} moves)")
+    count("rooms_recovered")
+    return room
+
+
+rooms = room_store.open_store(ROOM_STORE, load=load_room if move_log else None)
+
+# Rooms each socket connected to this process has joined, so a disconnect
+# goes straight to them instead of searching every room
+sid_rooms = {}  # socket.id -> set of room_id
+sid_rooms_lock = threading.Lock()
+
+# Lifecycle counters for /metrics (this process)
+metrics = {"rooms_created": 0, "rooms_recovered": 0, "rooms_evicted_idle": 0, "rooms_evicted_cap": 0,
+           "joins_refused": 0, "games_archived": 0}
+metrics_lock = threading.Lock()
+archive_lock = threading.Lock()
+_sweeper_started = False
+
+
+def count(metric, n=1):
+    with metrics_lock:
+        metrics[metric] += n
+
+
+def archive_game(room_id, board):
+    """Append the room's game to ARCHIVE_FILE (nothing if off or no moves)."""
+    if ARCHIVE_FILE is None or not board.move_stack:
+        return
+    if ARCHIVE_FILE.endswith(".pgn"):
+        game = chess.pgn.Game.from_board(board)
+        game.headers["Event"] = f"Room {room_id}"
+        game.headers["Date"] = datetime.date.today().strftime("%Y.%m.%d")
+        record = str(game) + "\n\n"
+    else:
+        record = json.dumps({"room": room_id, "start": board.root().fen(), "result": board.result(),
+                             "moves": [move.uci() for move in board.move_stack],
+                             "ended": int(time.time())}) + "\n"
+    with archive_lock:
+        with open(ARCHIVE_FILE, "a") as f:
+            f.write(record)
+    count("games_archived")
+
+
+def evict_room(room_id, max_idle_s, reason):
+    """Close room_id if nobody is in it and it was idle max_idle_s. Returns True if closed."""
+    with rooms.room(room_id, create=False) as room:
+        if room is None or room["players"] or time.time() - room["touched"] < max_idle_s:
+            return False
+        archive_game(room_id, room["board"])
+        if move_log is not None:
+            move_log.remove(room_id)
+        room["closed"] = True
+    count(reason)
+    return True
+
+
+def make_room_for(room_id):
+    """
+    Before a join: True if room_id exists or may be created. At MAX_ROOMS
+    the least recently used empty room is evicted first; False if there
+    is none.
+    """
+    if rooms.exists(room_id):
+        return True
+    if rooms.count() >= MAX_ROOMS:
+        if not any(evict_room(other, 0, "rooms_evicted_cap") for other in rooms.idle_rooms(limit=3)):
+            count("joins_refused")
+            return False
+    if move_log is None or not move_log.exists(room_id):
+        count("rooms_created")  # otherwise rebuilt from its log: rooms_recovered
+    return True
+
+
+def sweep_idle_rooms():
+    """Evict empty rooms idle for ROOM_IDLE_S (and rooms only left as move logs)."""
+    before = time.time() - ROOM_IDLE_S
+    stale = rooms.idle_rooms(before=before)
+    if move_log is not None:
+        # Rooms nobody rejoined since a restart: evict_room rebuilds them from the log first
+        stale += [room_id for room_id in move_log.stale_rooms(before) if not rooms.exists(room_id)]
+    for room_id in stale:
+        try:
+            evict_room(room_id, ROOM_IDLE_S, "rooms_evicted_idle")
+        except Exception as e:
+            print(f"Sweep of room {room_id} failed:", e)
+
+
+def sweep_rooms():
+    """Background task: sweep_idle_rooms every SWEEP_INTERVAL_S."""
+    while True:
+        socketio.sleep(SWEEP_INTERVAL_S)
+        sweep_idle_rooms()
+
+
+def start_sweeper():
+    global _sweeper_started
+    if not _sweeper_started:
+        _sweeper_started = True
+        socketio.start_background_task(sweep_rooms)
+
+# What a client gets in board_update, chosen when it joins:
+#   "fen" — fen, turn, last_move, capture (and undo): a few dozen bytes
+#   "svg" — the same plus the rendered board (browsers; the default)
+# Each level is its own Socket.IO room, and the SVG is only rendered when
+# someone in the game asked for it.
+PAYLOAD_LEVELS = ("fen", "svg")
+
+
+class SvgCache:
+    """
+    Rendered boards, least recently used first out. Keyed by (FEN, last
+    move, orientation, size), so every join, reconnect and spectator of the
+    same position is a lookup instead of a render. Evicts once either
+    max_entries or max_bytes (SVG + gzip) is exceeded.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> [svg, gzip bytes or None]
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def _entry(self, board, last_move, orientation, size):
+        key = (board.fen(), last_move.uci() if last_move is not None else None, orientation, size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return key, entry
+            self.misses += 1
+
+        svg = chess.svg.board(board=board, lastmove=last_move, orientation=orientation,
+                              coordinates=True, size=size)
+        entry = [svg, None]
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = entry
+                self.bytes += len(svg)
+                self._evict()
+            return key, self.entries.get(key, entry)
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (svg, gz) = self.entries.popitem(last=False)
+            self.bytes -= len(svg) + (len(gz) if gz else 0)
+
+    def svg(self, board, last_move=None, orientation=chess.WHITE, size=480):
+        return self._entry(board, last_move, orientation, size)[1][0]
 
-# Each room_id maps to a chess.Board and game state
-rooms = {}
+    def gzipped(self, board, last_move=None, orientation=chess.WHITE, size=480):
+        """The same SVG, gzip-compressed once and kept alongside it."""
+        key, entry = self._entry(board, last_move, orientation, size)
+        if entry[1] is None:
+            gz = gzip.compress(entry[0].encode(), compresslevel=6)
+            with self.lock:
+                if entry[1] is None and self.entries.get(key) is entry:
+                    entry[1] = gz
+                    self.bytes += len(gz)
+                    self._evict()
+            return gz
+        return entry[1]
 
 
-def get_or_create_room(room_id):
-    """Retrieve the game room or create a new one."""
-    if room_id not in rooms:
-        rooms[room_id] = {
-            "board": chess.Board(),
-            "last_move": None,
-            "players": {}  # socket.id -> color
-        }
-    return rooms[room_id]
+svg_cache = SvgCache()
+
+
+# Legal moves (UCI) of recently seen positions, by FEN. Moves are checked
+# with board.is_legal (no move generation, and no FEN to build); the full
+# list is only generated to explain a rejection, and clients that retry
+# from the same position get it from here.
+LEGAL_CACHE_SIZE = 4096
+legal_cache = OrderedDict()
+legal_cache_lock = threading.Lock()
+
+
+def legal_moves(board):
+    """Set of legal UCI moves of the position, cached per FEN."""
+    fen = board.fen()
+    with legal_cache_lock:
+        moves = legal_cache.get(fen)
+        if moves is not None:
+            legal_cache.move_to_end(fen)
+            return moves
+    moves = frozenset(move.uci() for move in board.legal_moves)
+    with legal_cache_lock:
+        legal_cache[fen] = moves
+        while len(legal_cache) > LEGAL_CACHE_SIZE:
+            legal_cache.popitem(last=False)
+    return moves
+
+
+def reject_move(data, reason, board=None):
+    """Tell the sender (only) why its move was not played."""
+    rejection = {"room": data.get("room"), "from": data.get("from"), "to": data.get("to"),
+                 "reason": reason}
+    if board is not None:
+        rejection["fen"] = board.fen()
+        if reason == "illegal":
+            start = str(data["from"]).lower()
+            rejection["legal"] = sorted(uci[2:4] for uci in legal_moves(board) if uci[:2] == start)
+    emit("move_rejected", rejection)
+
+
+def encode_move(move):
+    """A move for a payload: two bytes with msgpack, UCI text with JSON."""
+    if move is None:
+        return None
+    return wire.pack_move(move) if SERIALIZER == "msgpack" else move.uci()
+
+
+def stamp_trace(trace, stage):
+    """Add this hop to a move's latency trace (see Detection/Tracing.py), if it has one."""
+    if isinstance(trace, dict) and isinstance(trace.get("stamps"), list):
+        trace["stamps"].append([stage, time.time()])
+        return trace
+    return None
+
+
+def board_state(board, last_move, capture):
+    """Return the compact board_update payload (turn, FEN, last move)."""
+    return {"turn": "white" if board.turn else "black", "fen": board.fen(),
+            "last_move": encode_move(last_move), "capture": capture}
 
 
 def board_svg(board, last_move, capture):
     """Return SVG + turn info for broadcasting."""
-    svg = chess.svg.board(board=board, lastmove=last_move, coordinates=True, size=480)
-    return {"svg": svg, "turn": "white" if board.turn else "black", 'fen':board.fen(), 
-            "last_move": last_move.uci() if last_move is not None else None, "capture": capture}
+    svg = svg_cache.svg(board, last_move)
+    return {"svg": svg, **board_state(board, last_move, capture)}
+
+
+def level_room(room_id, level):
+    return f"{room_id}:{level}"
+
+
+def broadcast_board(room_id, room, capture=False, **extra):
+    """Send board_update to everyone in the room, at their payload level."""
+    levels = set(room["payload"].values())
+    if "fen" in levels:
+        emit("board_update", {**board_state(room["board"], room["last_move"], capture), **extra},
+             room=level_room(room_id, "fen"))
+    if "svg" in levels:
+        emit("board_update", {**board_svg(room["board"], room["last_move"], capture), **extra},
+             room=level_room(room_id, "svg"))
 
 
 @app.route("/")
@@ -36,7 +341,37 @@ def home():
 
 @app.route("/game/<room_id>")
 def game(room_id):
-    return render_template("index.html", room_id=room_id)
+    return render_template("index.html", room_id=room_id, serializer=SERIALIZER)
+
+
+@app.route("/metrics")
+def room_metrics():
+    with metrics_lock:
+        snapshot = dict(metrics)
+    with sid_rooms_lock:
+        snapshot["sockets"] = len(sid_rooms)
+    snapshot["rooms_live"] = rooms.count()
+    return jsonify(snapshot)
+
+
+@app.route("/game/<room_id>/board.svg")
+def game_board(room_id):
+    """Current board as an image (gzip'd from the cache when accepted)."""
+    with rooms.room(room_id, create=False) as room:
+        if room is None:
+            abort(404)
+        board, last_move = room["board"].copy(), room["last_move"]
+    flipped = request.args.get("orientation") == "black"
+    orientation = chess.BLACK if flipped else chess.WHITE
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = Response(svg_cache.gzipped(board, last_move, orientation),
+                            mimetype="image/svg+xml")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(svg_cache.svg(board, last_move, orientation),
+                            mimetype="image/svg+xml")
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
 
 
 # ---- SOCKET.IO EVENTS ---- #
@@ -44,86 +379,175 @@ def game(room_id):
 @socketio.on("join")
 def on_join(data):
     room_id = data["room"]
-    room = get_or_create_room(room_id)
+    level = data.get("payload", "svg")
+    if level not in PAYLOAD_LEVELS:
+        level = "svg"
+    start_sweeper()
+    if not make_room_for(room_id):
+        emit("room_full", {"room": room_id, "max_rooms": MAX_ROOMS})
+        return
     join_room(room_id)
 
-    # Assign color if available
-    if "white" not in room["players"].values():
-        color = "white"
-    elif "black" not in room["players"].values():
-        color = "black"
-    else:
-        color = "spectator"
+    with sid_rooms_lock:
+        sid_rooms.setdefault(request.sid, set()).add(room_id)
+
+    with rooms.room(room_id) as room:
+        # Assign color if available (a client joining again keeps its own)
+        color = room["players"].get(request.sid)
+        if color is None:
+            slots = room["slots"]
+            color = next((c for c in ("white", "black") if slots[c] is None), "spectator")
+            if color != "spectator":
+                slots[color] = request.sid
+
+        # Rejoining at another payload level: stop getting the old one
+        old_level = room["payload"].get(request.sid)
+        if old_level not in (None, level):
+            leave_room(level_room(room_id, old_level))
+        join_room(level_room(room_id, level))
 
-    room["players"][request.sid] = color
+        room["players"][request.sid] = color
+        room["payload"][request.sid] = level
+        room["touched"] = time.time()
 
-    emit("player_color", {"color": color})
-    emit("board_update", board_svg(room["board"], room["last_move"], False), room=room_id)
+        # Only the new client needs the current board
+        emit("player_color", {"color": color})
+        if level == "svg":
+            emit("board_update", board_svg(room["board"], room["last_move"], False))
+        else:
+            emit("board_update", board_state(room["board"], room["last_move"], False))
     print(f"Client {request.sid} joined room {room_id} as {color}")
 
 
 @socketio.on("move")
 def handle_move(data):
-    room_id = data["room"]
-    from_sq, to_sq = data["from"], data["to"]
-    return_svg = data.get("return_svg", True)
+    """
+    Play data["from"] -> data["to"] (or data["move"], packed) for the
+    sender. A move that is not played is answered with move_rejected
+    (reason: bad_request, no_room, not_a_player, not_your_turn, game_over
+    or illegal, plus the current FEN and, for illegal moves, the legal
+    destinations of that piece). A "trace" sent with the move is stamped
+    and handed on in the board_update.
+    """
+    room_id = data.get("room")
+    trace = stamp_trace(data.get("trace"), "server_received")
+    promotion = None
+    try:
+        if "move" in data:
+            sent = wire.read_move(data["move"])  # packed (or UCI) instead of from / to
+            from_square, to_square, promotion = sent.from_square, sent.to_square, sent.promotion
+            data = {**data, "from": chess.square_name(from_square), "to": chess.square_name(to_square)}
+        else:
+            from_square = chess.parse_square(str(data["from"]).lower())
+            to_square = chess.parse_square(str(data["to"]).lower())
+    except (AttributeError, KeyError, TypeError, ValueError):
+        reject_move(data, "bad_request")
+        return
 
-    room = get_or_create_room(room_id)
-    board = room["board"]
+    with rooms.room(room_id, create=False) as room:
+        if room is None:
+            reject_move(data, "no_room")
+            return
+        board = room["board"]
 
-    # Check player's color
-    player_color = room["players"].get(request.sid)
-    if player_color == "spectator":
-        return  # spectators can't move
+        # Check player's color
+        player_color = room["players"].get(request.sid)
+        if player_color not in ("white", "black"):
+            reject_move(data, "not_a_player", board)
+            return  # spectators can't move
 
-    # Ensure it's their turn
-    if (board.turn and player_color != "white") or (not board.turn and player_color != "black"):
-        return
+        # Ensure it's their turn
+        if board.turn != (player_color == "white"):
+            reject_move(data, "not_your_turn", board)
+            return
 
-    try:
-        move = chess.Move.from_uci(from_sq + to_sq)
-        if (board.piece_type_at(chess.parse_square(from_sq)) == chess.PAWN and
-                chess.square_rank(chess.parse_square(to_sq)) in [0, 7]):
-            move.promotion = chess.QUEEN
-        if move in board.legal_moves:
-            capture = board.is_capture(move)
-            board.push(move)
-            room["last_move"] = move
-            
-            print(capture)
-            emit("board_update", board_svg(board, move, capture), room=room_id)
-
-    except Exception as e:
-        print("Invalid move:", e)
+        if promotion is None and board.piece_type_at(from_square) == chess.PAWN \
+                and chess.square_rank(to_square) in (0, 7):
+            promotion = chess.QUEEN  # from / to moves (and packed ones without a piece) promote to a queen
+        move = chess.Move(from_square, to_square, promotion)
+        if not board.is_legal(move):
+            reject_move(data, "game_over" if board.is_game_over() else "illegal", board)
+            return
+
+        capture = board.is_capture(move)
+        board.push(move)
+        room["last_move"] = move
+        room["touched"] = time.time()
+        if move_log is not None:
+            move_log.move(room_id, move)
+
+        print(capture)
+        if trace is not None:
+            broadcast_board(room_id, room, capture, trace=stamp_trace(trace, "server_broadcast"))
+        else:
+            broadcast_board(room_id, room, capture)
 
 
 @socketio.on("undo")
 def handle_undo(data):
     room_id = data["room"]
-    room = get_or_create_room(room_id)
-    if room["board"].move_stack:
-        room["board"].pop()
-        room["last_move"] = None
-        emit("board_update", board_svg(room["board"], None, False), room=room_id)
+    with rooms.room(room_id, create=False) as room:
+        if room is not None and room["board"].move_stack:
+            undone = room["board"].pop()
+            room["last_move"] = None
+            room["touched"] = time.time()
+            if move_log is not None:
+                move_log.undo(room_id, undone)
+            # Tell clients which move was taken back, so the physical board can
+            # reverse just that move instead of rebuilding the whole position
+            broadcast_board(room_id, room, undo=encode_move(undone))
 
 
 @socketio.on("reset")
 def handle_reset(data):
     room_id = data["room"]
-    room = get_or_create_room(room_id)
-    room["board"] = chess.Board()
-    room["last_move"] = None
-    emit("board_update", board_svg(room["board"], None, False), room=room_id)
+    with rooms.room(room_id, create=False) as room:
+        if room is None:
+            return
+        archive_game(room_id, room["board"])
+        room["board"] = chess.Board()
+        room["last_move"] = None
+        room["touched"] = time.time()
+        if move_log is not None:
+            move_log.start(room_id, room["board"])
+        broadcast_board(room_id, room, reset=True)
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
-    for room_id, room in rooms.items():
-        if request.sid in room["players"]:
-            del room["players"][request.sid]
+    with sid_rooms_lock:
+        joined = sid_rooms.pop(request.sid, ())
+    for room_id in joined:
+        with rooms.room(room_id, create=False) as room:
+            if room is None:
+                continue
+            color = room["players"].pop(request.sid, None)
+            room["payload"].pop(request.sid, None)
+            if color in room["slots"] and room["slots"][color] == request.sid:
+                room["slots"][color] = None
+            room["touched"] = time.time()
             print(f"Client {request.sid} left room {room_id}")
-            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chess room server")
+    parser.add_argument("--prod", action="store_true",
+                        help="production: no debugger or reloader (set ASYNC_MODE for the worker)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not args.prod:
+        socketio.run(app, host=args.host, port=args.port, debug=True)
+        return
+
+    print(f"Serving on {args.host}:{args.port} (async_mode={socketio.async_mode})")
+    if socketio.async_mode == "threading":
+        print("Warning: threading mode uses one OS thread per socket; "
+              "set ASYNC_MODE=eventlet for many concurrent clients.")
+    socketio.run(app, host=args.host, port=args.port, debug=False, use_reloader=False,
+                 log_output=False, allow_unsafe_werkzeug=socketio.async_mode == "threading")
 
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
+    main()
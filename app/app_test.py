@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+import time
+
+import chess
+import pytest
+
+import app
+import move_log
+import room_store
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(app, "rooms", room_store.MemoryRoomStore())
+    monkeypatch.setattr(app, "metrics", dict.fromkeys(app.metrics, 0))
+    monkeypatch.setattr(app, "_sweeper_started", True)   # sweeps are run by hand here
+    return app
+
+def join(server, room_id, payload="fen"):
+    client = server.socketio.test_client(server.app)
+    client.emit("join", {"room": room_id, "payload": payload})
+    client.get_received()
+    return client
+
+def age(server, room_id, seconds):
+    with server.rooms.room(room_id, create=False) as room:
+        room["touched"] = time.time() - seconds
+
+def test_idle_rooms_are_evicted(server, monkeypatch):
+    monkeypatch.setattr(server, "ROOM_IDLE_S", 60)
+    join(server, "old").disconnect()
+    join(server, "new").disconnect()
+    busy = join(server, "busy")
+    age(server, "old", 120)
+    age(server, "busy", 120)
+
+    server.sweep_idle_rooms()
+    server.sweep_idle_rooms()   # a sweep looking at a room does not make it look busy
+    assert(sorted(server.rooms.room_ids()) == ["busy", "new"])
+    assert(server.metrics["rooms_evicted_idle"] == 1)
+
+    age(server, "new", 120)
+    server.sweep_idle_rooms()
+    assert(server.rooms.room_ids() == ["busy"])
+    busy.disconnect()
+
+def test_cap_evicts_least_recently_used_empty_room(server, monkeypatch):
+    monkeypatch.setattr(server, "MAX_ROOMS", 3)
+    for room_id, idle_s in [("b", 50), ("a", 100), ("c", 10)]:
+        join(server, room_id).disconnect()
+        age(server, room_id, idle_s)
+    for room_id in ("a", "b", "c"):    # looking does not reorder them
+        with server.rooms.room(room_id, create=False):
+            pass
+
+    players = [join(server, "d")]
+    assert(sorted(server.rooms.room_ids()) == ["b", "c", "d"])
+    players.append(join(server, "e"))
+    players.append(join(server, "f"))
+    assert(sorted(server.rooms.room_ids()) == ["d", "e", "f"])
+    assert(server.metrics["rooms_evicted_cap"] == 3)
+
+    refused = server.socketio.test_client(server.app)
+    refused.emit("join", {"room": "g", "payload": "fen"})
+    assert([event["name"] for event in refused.get_received()] == ["room_full"])
+    assert(server.metrics["joins_refused"] == 1)
+    for client in players + [refused]:
+        client.disconnect()
+
+def test_sweep_archives_logs_of_rooms_never_rejoined(server, monkeypatch, tmp_path):
+    log = move_log.MoveLog(str(tmp_path / "logs"))
+    monkeypatch.setattr(server, "move_log", log)
+    monkeypatch.setattr(server, "rooms", room_store.MemoryRoomStore(server.load_room))
+    monkeypatch.setattr(server, "ARCHIVE_FILE", str(tmp_path / "games.jsonl"))
+    monkeypatch.setattr(server, "ROOM_IDLE_S", 60)
+    log.start("left", chess.Board())             # written before a restart
+    log.move("left", chess.Move.from_uci("e2e4"))
+    log.start("recent", chess.Board())
+    log.sync()
+    old = time.time() - 120
+    os.utime(log.path("left"), (old, old))
+
+    server.sweep_idle_rooms()
+    assert(not log.exists("left") and log.exists("recent"))
+    with open(tmp_path / "games.jsonl") as f:
+        assert(json.loads(f.read())["moves"] == ["e2e4"])
+
+def events(client, name):
+    return [event["args"][0] for event in client.get_received() if event["name"] == name]
+
+def test_slots_are_assigned_and_released(server):
+    white, black, watcher = (join(server, "s") for _ in range(3))
+    with server.rooms.room("s") as room:
+        assert(sorted(room["players"].values()) == ["black", "spectator", "white"])
+        assert(room["slots"]["white"] is not None and room["slots"]["black"] is not None)
+    white.disconnect()
+    with server.rooms.room("s") as room:
+        assert(room["slots"]["white"] is None)
+    again = server.socketio.test_client(server.app)
+    again.emit("join", {"room": "s", "payload": "fen"})
+    assert(events(again, "player_color") == [{"color": "white"}])   # the freed slot
+    for client in (black, watcher, again):
+        client.disconnect()
+
+def test_rejected_moves(server):
+    white, black, watcher = (join(server, "r") for _ in range(3))
+
+    black.emit("move", {"room": "r", "from": "e7", "to": "e5"})
+    rejection, = events(black, "move_rejected")
+    assert(rejection["reason"] == "not_your_turn" and rejection["fen"] == chess.STARTING_FEN)
+
+    watcher.emit("move", {"room": "r", "from": "e2", "to": "e4"})
+    assert(events(watcher, "move_rejected")[0]["reason"] == "not_a_player")
+
+    white.emit("move", {"room": "r", "from": "e2", "to": "e5"})
+    rejection, = events(white, "move_rejected")
+    assert(rejection["reason"] == "illegal" and rejection["legal"] == ["e3", "e4"])
+
+    white.emit("move", {"room": "r", "from": "e2"})
+    assert(events(white, "move_rejected")[0]["reason"] == "bad_request")
+    white.emit("move", {"room": "nowhere", "from": "e2", "to": "e4"})
+    assert(events(white, "move_rejected")[0]["reason"] == "no_room")
+
+    for uci in ["f2f3", "e7e5", "g2g4", "d8h4"]:     # fool's mate
+        (white if uci[1] in "12" else black).emit("move", {"room": "r", "from": uci[:2], "to": uci[2:]})
+    assert(not events(white, "move_rejected") and not events(black, "move_rejected"))
+    white.emit("move", {"room": "r", "from": "a2", "to": "a3"})
+    assert(events(white, "move_rejected")[0]["reason"] == "game_over")
+    for client in (white, black, watcher):
+        client.disconnect()
+
+def test_payload_levels(server):
+    fen, svg = join(server, "p", "fen"), join(server, "p", "svg")
+    fen.emit("move", {"room": "p", "from": "e2", "to": "e4"})
+    fen_update, = events(fen, "board_update")
+    svg_update, = events(svg, "board_update")
+    assert("svg" not in fen_update and fen_update["fen"] == svg_update["fen"])
+    assert(svg_update["svg"].startswith("<svg"))
+
+    browser = join(server, "p", "svg")                    # keeps the svg level in use
+    svg.emit("join", {"room": "p", "payload": "fen"})     # rejoin at the other level
+    svg.get_received()
+    fen.emit("reset", {"room": "p"})
+    assert(["svg" in update for update in events(svg, "board_update")] == [False])
+    assert(["svg" in update for update in events(browser, "board_update")] == [True])
+    for client in (fen, svg, browser):
+        client.disconnect()
+
+def test_svg_cache():
+    cache = app.SvgCache(max_entries=2)
+    board = chess.Board()
+    e4 = chess.Move.from_uci("e2e4")
+
+    first = cache.svg(board)
+    assert(cache.svg(board) is first and (cache.hits, cache.misses) == (1, 1))
+    cache.svg(board, orientation=chess.BLACK)       # keyed by orientation ...
+    assert((cache.hits, cache.misses) == (1, 2))
+    cache.svg(board)                                 # (starting position is now most recent)
+    board.push(e4)
+    cache.svg(board, e4)                             # ... and by position + last move: evicts black
+    assert(len(cache.entries) == 2 and (cache.hits, cache.misses) == (2, 3))
+    assert(all(key[2] == chess.WHITE for key in cache.entries))
+    cache.svg(board)                                 # same FEN, no last move: another entry
+    assert(cache.misses == 4 and len(cache.entries) == 2)
+
+    gz = cache.gzipped(board)
+    assert(cache.gzipped(board) is gz and gzip.decompress(gz).decode() == cache.svg(board))
+    assert(cache.bytes == sum(len(svg) + (len(g) if g else 0) for svg, g in cache.entries.values()))
+
+    second = cache.svg(board, e4)
+    small = app.SvgCache(max_bytes=len(first) + len(second) - 1)   # the byte budget evicts too
+    small.svg(chess.Board())
+    small.svg(board, e4)
+    assert(list(small.entries) == [(board.fen(), "e2e4", chess.WHITE, 480)])
@@ -1,9 +1,13 @@
+import os
 import socketio
 import time
 import threading
 
+import wire
+
 SERVER_URL = "http://localhost:5000"
-sio = socketio.Client()
+SERIALIZER = os.environ.get("SERIALIZER", "json")  # must match the server
+sio = socketio.Client(serializer=wire.socketio_serializer(SERIALIZER))
 
 current_turn = None
 connected = False
@@ -44,6 +48,13 @@ def on_board_update(data):
     print(f"💾 Saved board to board_{room}.svg")
 
 
+@sio.on("move_rejected")
+def on_move_rejected(data):
+    print(f"⛔ Move {data.get('from')}{data.get('to')} rejected: {data.get('reason')}")
+    if data.get("legal"):
+        print(f"   Legal from {data.get('from')}: {', '.join(data['legal'])}")
+
+
 # --------------------
 # Command Functions
 # --------------------
@@ -126,7 +137,7 @@ def main():
 
     # Ask which room to join
     room = input("🏠 Enter room name (e.g., game1, test, etc.): ").strip() or "default"
-    sio.emit("join", {"room": room})
+    sio.emit("join", {"room": room, "payload": "svg"})
     print(f"📥 Joined room: {room}")
 
     threading.Thread(target=input_thread, daemon=True).start()
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import chess
+import socketio  # pip install "python-socketio[asyncio_client]" (needs aiohttp)
+
+import wire
+
+# Load generator for app.py: bot clients (the same events as client.py)
+# playing random legal moves in many rooms at once.
+#   • Each room gets a white bot, a black bot and --spectators watchers
+#   • A bot moves as soon as a board_update says it is its turn, and times
+#     each move from emit("move") to the board_update carrying it back
+#   • Connections are opened --ramp per second so the server is not hit
+#     with every handshake at once
+#
+#   python loadgen.py --rooms 200 --moves 40                  # 400 players
+#   python loadgen.py --url http://club:5000 --rooms 500 --spectators 2
+#   python loadgen.py --serializer msgpack   # server started with SERIALIZER=msgpack
+#
+# Asyncio bots, so one process can drive thousands of sockets.
+
+SERVER_URL = "http://localhost:5000"
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []    # s, move emitted -> own board_update received
+        self.updates = 0
+        self.update_bytes = 0
+        self.connect_errors = 0
+        self.games_done = 0
+
+
+class Ramp:
+    """Spaces calls to wait() 1/per_second apart."""
+
+    def __init__(self, per_second):
+        self.interval = 1 / per_second
+        self.next = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next)
+        self.next = start + self.interval
+        await asyncio.sleep(start - now)
+
+
+class Bot:
+    def __init__(self, url, room, payload, serializer, stats, max_plies, game_over):
+        self.url = url
+        self.room = room
+        self.payload = payload
+        self.stats = stats
+        self.max_plies = max_plies
+        self.game_over = game_over
+        self.color = None
+        self.sent = None       # (uci, time) of the move waiting to come back
+        self.packed_moves = serializer == "msgpack"
+        if serializer == "msgpack":
+            import msgpack
+            self.encoded_size = lambda data: len(msgpack.packb(data))
+        else:
+            self.encoded_size = lambda data: len(json.dumps(data))
+        self.sio = socketio.AsyncClient(reconnection=False, serializer=wire.socketio_serializer(serializer))
+        self.sio.on("player_color", self.on_color)
+        self.sio.on("board_update", self.on_board_update)
+
+    async def on_color(self, data):
+        self.color = data.get("color")
+
+    async def on_board_update(self, data):
+        now = time.perf_counter()
+        self.stats.updates += 1
+        self.stats.update_bytes += self.encoded_size(data)
+
+        last_move = wire.read_move(data.get("last_move"))
+        if self.sent is not None and last_move is not None and last_move.uci()[:4] == self.sent[0]:
+            self.stats.latencies.append(now - self.sent[1])
+            self.sent = None
+
+        if data.get("turn") != self.color or self.game_over.is_set():
+            return
+        board = chess.Board(data["fen"])
+        if board.is_game_over() or board.ply() >= self.max_plies:
+            self.stats.games_done += 1
+            self.game_over.set()
+            return
+
+        uci = random.choice(list(board.legal_moves)).uci()[:4]
+        self.sent = (uci, time.perf_counter())
+        if self.packed_moves:
+            await self.sio.emit("move", {"room": self.room, "move": wire.pack_move(chess.Move.from_uci(uci))})
+        else:
+            await self.sio.emit("move", {"room": self.room, "from": uci[:2], "to": uci[2:4]})
+
+    async def start(self):
+        try:
+            await self.sio.connect(self.url, transports=["websocket"])
+            await self.sio.emit("join", {"room": self.room, "payload": self.payload})
+        except Exception:
+            self.stats.connect_errors += 1
+            return False
+        return True
+
+    async def stop(self):
+        try:
+            await self.sio.disconnect()
+        except Exception:
+            pass
+
+
+async def play_room(args, index, stats, ramp):
+    room = f"{args.prefix}{index}"
+    game_over = asyncio.Event()
+    bots = [Bot(args.url, room, args.payload, args.serializer, stats, args.moves, game_over)
+            for _ in range(2 + args.spectators)]
+
+    # Join one at a time so white / black / spectators are assigned in order
+    for bot in bots:
+        await ramp.wait()
+        if not await bot.start():
+            game_over.set()
+            break
+        while bot.color is None and bot.sio.connected:
+            await asyncio.sleep(0.01)
+
+    try:
+        await asyncio.wait_for(game_over.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    for bot in bots:
+        await bot.stop()
+
+
+async def run(args):
+    stats = Stats()
+    ramp = Ramp(args.ramp)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(play_room(args, i, stats, ramp) for i in range(args.rooms)))
+    return stats, time.perf_counter() - t0
+
+
+def report(args, stats, elapsed):
+    clients = args.rooms * (2 + args.spectators)
+    print(f"{args.rooms} rooms, {clients} clients ({args.payload}, {args.serializer}), {elapsed:.1f} s")
+    print(f"  connect errors: {stats.connect_errors}, games finished: {stats.games_done}")
+    moves = len(stats.latencies)
+    print(f"  moves: {moves} ({moves / elapsed:.1f}/s), board_updates: {stats.updates} "
+          f"({stats.update_bytes / max(stats.updates, 1):.0f} B avg)")
+    if moves:
+        lat = sorted(stats.latencies)
+        p95 = lat[min(moves - 1, int(0.95 * moves))]
+        print(f"  move latency ms: p50 {1000 * statistics.median(lat):.1f}, "
+              f"p95 {1000 * p95:.1f}, max {1000 * lat[-1]:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot load generator for the chess server")
+    parser.add_argument("--url", default=SERVER_URL)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--spectators", type=int, default=0, help="watchers per room")
+    parser.add_argument("--moves", type=int, default=40, help="plies per game")
+    parser.add_argument("--payload", choices=["fen", "svg"], default="fen")
+    parser.add_argument("--serializer", choices=wire.SERIALIZERS, default="json",
+                        help="must match the server's SERIALIZER")
+    parser.add_argument("--ramp", type=int, default=100, help="new connections per second")
+    parser.add_argument("--timeout", type=float, default=300, help="s per game before giving up")
+    parser.add_argument("--prefix", default="load", help="room name prefix")
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(run(args))
+    report(args, stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# move_log.py — games that survive a server restart
+# Every room has an append-only log, <directory>/<room id>.jsonl, one JSON
+# line per change:
+#   {"start": FEN}      the position the game started from (first line;
+#                       without it the game started from the usual setup)
+#   {"move": "e2e4"}    a move was played
+#   {"undo": "e2e4"}    the last move was taken back
+# A reset starts the file over. Nothing else is written per move, so a move
+# costs one short append instead of saving the whole room.
+#   • writes go to the OS straight away; a background thread fsyncs every
+#     room written since its last pass (every fsync_interval_s), so one fsync
+#     covers a burst of moves and a crash loses at most that window. Under
+#     eventlet / gevent that "thread" is a green thread, so pass offload
+#     (eventlet.tpool.execute, or gevent's hub threadpool apply) to run each
+#     fsync in a real OS thread instead of blocking the event loop
+#   • replay() rebuilds a room's board from its log; app.py only calls it
+#     the first time a room is used after a restart (lazy recovery)
+#   • a torn last line (crash mid-write) is ignored on replay
+#   • stale_rooms() lists logs untouched for a while, so rooms nobody
+#     rejoined after a restart can still be archived and removed
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import chess
+
+
+class MoveLog:
+    def __init__(self, directory, fsync_interval_s=0.1, offload=None):
+        self.directory = directory
+        self.fsync_interval_s = fsync_interval_s
+        self.offload = offload or (lambda fn, *args: fn(*args))  # offload(fn, *args) -> fn(*args)
+        self.pending = {}  # room_id -> open file written since the last fsync
+        self.new_files = False  # a log was created: the directory needs an fsync too
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._fsync_loop, daemon=True).start()
+
+    def path(self, room_id):
+        return os.path.join(self.directory, urllib.parse.quote(room_id, safe="") + ".jsonl")
+
+    def exists(self, room_id):
+        return os.path.exists(self.path(room_id))
+
+    def modified(self, room_id):
+        """time.time() of the room's last logged change."""
+        return os.path.getmtime(self.path(room_id))
+
+    def stale_rooms(self, before):
+        """Ids of rooms whose log was last written before `before` (time.time())."""
+        stale = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".jsonl"):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) < before:
+                    stale.append(urllib.parse.unquote(name[:-len(".jsonl")]))
+            except FileNotFoundError:
+                pass  # removed meanwhile
+        return stale
+
+    def _write(self, room_id, records, mode="a"):
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        with self.lock:
+            f = self.pending.pop(room_id, None)
+            if f is not None and mode != "a":
+                f.close()
+                f = None
+            if f is None:
+                path = self.path(room_id)
+                self.new_files = self.new_files or not os.path.exists(path)
+                f = open(path, mode)
+            f.write(data)
+            f.flush()
+            self.pending[room_id] = f
+
+    def start(self, room_id, board):
+        """Start the room's log over from `board` (a new or reset game)."""
+        self._write(room_id, [{"start": board.root().fen()}]
+                    + [{"move": move.uci()} for move in board.move_stack], mode="w")
+
+    def move(self, room_id, move):
+        self._write(room_id, [{"move": move.uci()}])
+
+    def undo(self, room_id, move):
+        self._write(room_id, [{"undo": move.uci()}])
+
+    def remove(self, room_id):
+        with self.lock:
+            f = self.pending.pop(room_id, None)
+            if f is not None:
+                f.close()
+            try:
+                os.remove(self.path(room_id))
+            except FileNotFoundError:
+                pass
+
+    def replay(self, room_id):
+        """(board, last move or None) from the room's log, or None if it has none."""
+        try:
+            with open(self.path(room_id)) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+
+        board = chess.Board()
+        last_move = None
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # torn write at the end
+            if "start" in record:
+                board = chess.Board(record["start"])
+                last_move = None
+            elif "move" in record:
+                last_move = chess.Move.from_uci(record["move"])
+                board.push(last_move)
+            elif "undo" in record and board.move_stack:
+                board.pop()
+                last_move = None
+        return board, last_move
+
+    def sync(self):
+        """fsync everything written so far."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            new_files, self.new_files = self.new_files, False
+        for f in pending.values():
+            try:
+                self.offload(os.fsync, f.fileno())
+            finally:
+                f.close()
+        if new_files:
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                self.offload(os.fsync, fd)
+            finally:
+                os.close(fd)
+
+    def _fsync_loop(self):
+        while True:
+            time.sleep(self.fsync_interval_s)
+            try:
+                self.sync()
+            except Exception as e:
+                print("Move log fsync failed:", e)
@@ -0,0 +1,30 @@
+import os
+import chess
+import move_log
+
+def test_replay(tmp_path):
+    log = move_log.MoveLog(str(tmp_path))
+    assert(log.replay("g") is None)
+    for uci in ["e2e4", "e7e5", "g1f3"]:
+        log.move("g", chess.Move.from_uci(uci))
+    log.undo("g", chess.Move.from_uci("g1f3"))
+    log.sync()
+    with open(log.path("g"), "a") as f:
+        f.write('{"move": "g1')                    # torn by a crash
+    board, last_move = log.replay("g")
+    assert(board.move_stack == [chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")])
+    assert(last_move is None)
+
+    log.start("g", chess.Board())                 # reset
+    log.move("g", chess.Move.from_uci("d2d4"))
+    board, last_move = log.replay("g")
+    assert(len(board.move_stack) == 1 and last_move == chess.Move.from_uci("d2d4"))
+    log.remove("g")
+    assert(log.replay("g") is None)
+
+def test_fsync_is_offloaded(tmp_path):
+    calls = []
+    log = move_log.MoveLog(str(tmp_path), offload=lambda fn, *args: calls.append(fn) or fn(*args))
+    log.move("g", chess.Move.from_uci("e2e4"))
+    log.sync()
+    assert(calls and all(fn is os.fsync for fn in calls))
@@ -0,0 +1,395 @@
+# room_store.py — where app.py keeps its game rooms
+# A room is a dict:
+#   {"board": chess.Board, "last_move": chess.Move or None,
+#    "players": {sid: color}, "payload": {sid: payload level},
+#    "slots": {"white": sid or None, "black": sid or None},
+#    "touched": time.time() of the last activity}
+# Handlers use a store as
+#     with store.room(room_id) as room:
+#         ...read / change room...
+# which creates the room if needed (create=False yields None instead),
+# holds its lock for the block and saves it at the end (not if the block
+# raised). Setting room["closed"] = True in the block deletes the room.
+# The store saves "touched" as it finds it: handlers set it on real
+# activity (join, move, undo, reset, leave), so looking at a room does not
+# make it look busy. Rooms nobody is in are indexed by "touched", and
+# idle_rooms() lists them oldest first for eviction without opening them.
+# A store given load(room_id) -> room or None asks it first before treating
+# a room as new (app.py rebuilds rooms from their move logs this way). The
+# load runs under that room's lock only, so a long replay holds up nobody
+# else.
+#   • MemoryRoomStore — a dict in this process (single server process)
+#   • RedisRoomStore  — rooms as JSON in Redis, locked with SET NX PX, so
+#     several server processes behind a load balancer share them. Run it
+#     with a Socket.IO message_queue so broadcasts reach every process.
+#     Boards are replayed from the move list, or reused from a per-process
+#     cache when nobody else changed the room since. Saving and unlocking
+#     are Lua scripts that check the lock is still ours (and the saved
+#     version unchanged), so a holder whose lock expired mid-block gets
+#     RoomLockLost instead of overwriting a newer room or someone's lock.
+#   • LocalRedis      — in-process stand-in for the few Redis commands used,
+#     for tests and trying the Redis store without a server
+
+import contextlib
+import heapq
+import json
+import threading
+import time
+import uuid
+
+import chess
+
+
+def new_room():
+    return {"board": chess.Board(), "last_move": None, "players": {}, "payload": {},
+            "slots": {"white": None, "black": None}, "touched": time.time()}
+
+
+class MemoryRoomStore:
+    def __init__(self, load=None):
+        self.load = load
+        self.rooms = {}
+        self.locks = {}
+        self.idle = {}  # room_id -> touched, rooms with no players
+        self.lock = threading.Lock()  # guards the three dicts
+
+    @contextlib.contextmanager
+    def room(self, room_id, create=True):
+        lock = None
+        while True:
+            with self.lock:
+                if room_id not in self.locks:
+                    if self.load is None and not create:
+                        break
+                    self.rooms[room_id] = None  # placeholder until loaded under its own lock
+                    self.locks[room_id] = threading.RLock()
+                lock = self.locks[room_id]
+            lock.acquire()
+            with self.lock:
+                if self.locks.get(room_id) is lock:
+                    room = self.rooms[room_id]
+                    break
+            lock.release()  # closed while we waited: look it up again
+            lock = None
+
+        if lock is None:
+            yield None
+            return
+        try:
+            if room is None:
+                try:
+                    room = self.load(room_id) if self.load else None
+                finally:
+                    if room is None and not create:
+                        with self.lock:
+                            del self.rooms[room_id]
+                            del self.locks[room_id]
+                if room is None and not create:
+                    yield None
+                    return
+                room = room or new_room()
+                with self.lock:
+                    self.rooms[room_id] = room
+            yield room
+            with self.lock:
+                if room.get("closed"):
+                    del self.rooms[room_id]
+                    del self.locks[room_id]
+                    self.idle.pop(room_id, None)
+                elif room["players"]:
+                    self.idle.pop(room_id, None)
+                else:
+                    self.idle[room_id] = room["touched"]
+        finally:
+            lock.release()
+
+    def exists(self, room_id):
+        return self.rooms.get(room_id) is not None
+
+    def count(self):
+        return len(self.rooms)
+
+    def room_ids(self):
+        with self.lock:
+            return [room_id for room_id, room in self.rooms.items() if room is not None]
+
+    def idle_rooms(self, before=None, limit=None):
+        """Ids of rooms with no players, least recently touched first (touched <= before)."""
+        with self.lock:
+            items = [(touched, room_id) for room_id, touched in self.idle.items()
+                     if before is None or touched <= before]
+        items = heapq.nsmallest(limit, items) if limit is not None else sorted(items)
+        return [room_id for _, room_id in items]
+
+
+class RoomLockLost(RuntimeError):
+    """The room's lock expired during the block; its changes were not saved."""
+
+
+# KEYS[1] lock; ARGV[1] our token
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# KEYS[1] room, KEYS[2] lock; ARGV[1] our token, ARGV[2] version we loaded,
+# ARGV[3] new state ('' deletes the room). 1 if written, 0 if we lost the room.
+_SAVE_ROOM = """
+if redis.call('get', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+local current = redis.call('get', KEYS[1])
+local version = 0
+if current then
+    version = cjson.decode(current)['version']
+end
+if version ~= tonumber(ARGV[2]) then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('del', KEYS[1])
+else
+    redis.call('set', KEYS[1], ARGV[3])
+end
+return 1
+"""
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisRoomStore:
+    def __init__(self, client, prefix="chess:room:", lock_timeout_s=5.0, lock_ttl_s=10.0, retry_s=0.005,
+                 load=None):
+        self.client = client
+        self.load = load
+        self.prefix = prefix
+        self.index = prefix + "ids"           # set of live room ids
+        self.idle_index = prefix + "idle"     # sorted set: empty rooms by touched
+        self.lock_timeout_s = lock_timeout_s  # give up waiting for a room after this
+        self.lock_ttl_s = lock_ttl_s          # a crashed holder's lock expires after this
+        self.retry_s = retry_s
+        self.boards = {}  # room_id -> (version, chess.Board) last saved by this process
+        self.boards_lock = threading.Lock()
+
+    def _key(self, room_id):
+        return self.prefix + "id:" + room_id
+
+    @contextlib.contextmanager
+    def room(self, room_id, create=True):
+        key = self._key(room_id)
+        lock = key + ":lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout_s
+        while not self.client.set(lock, token, nx=True, px=int(self.lock_ttl_s * 1000)):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Room {room_id} is locked")
+            time.sleep(self.retry_s)
+        try:
+            room, version = self._load(room_id, key)
+            if room is None and self.load:
+                room = self.load(room_id)
+            if room is None and create:
+                room = new_room()
+            yield room
+            if room is None:
+                pass
+            elif room.get("closed"):
+                self._write(room_id, key, lock, token, version, "")
+                self.client.srem(self.index, room_id)
+                self.client.zrem(self.idle_index, room_id)
+                with self.boards_lock:
+                    self.boards.pop(room_id, None)
+            else:
+                self._save(room_id, key, lock, token, room, version + 1)
+        finally:
+            # Only drop the lock if it is still ours (it may have expired)
+            self.client.eval(_RELEASE_LOCK, 1, lock, token)
+
+    def _write(self, room_id, key, lock, token, version, data):
+        if not self.client.eval(_SAVE_ROOM, 2, key, lock, token, version, data):
+            raise RoomLockLost(f"Lock on room {room_id} expired; changes dropped")
+
+    def _load(self, room_id, key):
+        data = self.client.get(key)
+        if data is None:
+            return None, 0
+        state = json.loads(data)
+
+        with self.boards_lock:
+            cached = self.boards.pop(room_id, None)
+        if cached is not None and cached[0] == state["version"]:
+            board = cached[1]
+        else:
+            board = chess.Board(state["start"])
+            for uci in state["moves"]:
+                board.push(chess.Move.from_uci(uci))
+
+        last_move = chess.Move.from_uci(state["last_move"]) if state["last_move"] else None
+        room = {"board": board, "last_move": last_move,
+                "players": state["players"], "payload": state["payload"], "slots": state["slots"],
+                "touched": state["touched"]}
+        return room, state["version"]
+
+    def _save(self, room_id, key, lock, token, room, version):
+        board = room["board"]
+        state = {
+            "version": version,
+            "start": board.root().fen(),
+            "moves": [move.uci() for move in board.move_stack],
+            "last_move": room["last_move"].uci() if room["last_move"] is not None else None,
+            "players": room["players"],
+            "payload": room["payload"],
+            "slots": room["slots"],
+            "touched": room["touched"],
+        }
+        self._write(room_id, key, lock, token, version - 1, json.dumps(state))
+        if version == 1:
+            self.client.sadd(self.index, room_id)
+        if room["players"]:
+            self.client.zrem(self.idle_index, room_id)
+        else:
+            self.client.zadd(self.idle_index, {room_id: room["touched"]})
+        with self.boards_lock:
+            self.boards[room_id] = (version, board)
+
+    def exists(self, room_id):
+        return bool(self.client.sismember(self.index, room_id))
+
+    def count(self):
+        return self.client.scard(self.index)
+
+    def room_ids(self):
+        return [_text(room_id) for room_id in self.client.smembers(self.index)]
+
+    def idle_rooms(self, before=None, limit=None):
+        """Ids of rooms with no players, least recently touched first (touched <= before)."""
+        ids = self.client.zrangebyscore(self.idle_index, "-inf", "+inf" if before is None else before,
+                                        start=None if limit is None else 0, num=limit)
+        return [_text(room_id) for room_id in ids]
+
+
+class LocalRedis:
+    """The Redis commands RedisRoomStore uses, in memory (values come back as bytes)."""
+
+    def __init__(self):
+        self.scripts = {_RELEASE_LOCK: self._release_lock, _SAVE_ROOM: self._save_room}
+        self.data = {}  # key -> (bytes, expiry time or None)
+        self.sets = {}  # key -> set of bytes
+        self.zsets = {}  # key -> {member bytes: score}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self.lock:
+            item = self._live(key)
+            return item[0] if item is not None else None
+
+    def set(self, key, value, nx=False, px=None):
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return None
+            value = value if isinstance(value, bytes) else str(value).encode()
+            self.data[key] = (value, time.monotonic() + px / 1000 if px else None)
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum((self.data.pop(key, None) or self.sets.pop(key, None) or self.zsets.pop(key, None))
+                       is not None for key in keys)
+
+    def sadd(self, key, *members):
+        with self.lock:
+            s = self.sets.setdefault(key, set())
+            before = len(s)
+            s.update(m.encode() for m in members)
+            return len(s) - before
+
+    def srem(self, key, *members):
+        with self.lock:
+            s = self.sets.get(key, set())
+            before = len(s)
+            s.difference_update(m.encode() for m in members)
+            return before - len(s)
+
+    def sismember(self, key, member):
+        with self.lock:
+            return member.encode() in self.sets.get(key, ())
+
+    def scard(self, key):
+        with self.lock:
+            return len(self.sets.get(key, ()))
+
+    def smembers(self, key):
+        with self.lock:
+            return set(self.sets.get(key, ()))
+
+    def eval(self, script, numkeys, *keys_and_args):
+        """Only the scripts RedisRoomStore uses, run atomically like Redis does."""
+        keys, args = keys_and_args[:numkeys], [str(a).encode() for a in keys_and_args[numkeys:]]
+        with self.lock:
+            return self.scripts[script](keys, args)
+
+    def _release_lock(self, keys, args):
+        item = self._live(keys[0])
+        if item is not None and item[0] == args[0]:
+            del self.data[keys[0]]
+            return 1
+        return 0
+
+    def _save_room(self, keys, args):
+        lock = self._live(keys[1])
+        if lock is None or lock[0] != args[0]:
+            return 0
+        current = self._live(keys[0])
+        version = json.loads(current[0])["version"] if current is not None else 0
+        if version != int(args[1]):
+            return 0
+        if args[2] == b"":
+            self.data.pop(keys[0], None)
+        else:
+            self.data[keys[0]] = (args[2], None)
+        return 1
+
+    def zadd(self, key, mapping):
+        with self.lock:
+            z = self.zsets.setdefault(key, {})
+            added = sum(m.encode() not in z for m in mapping)
+            z.update((m.encode(), float(score)) for m, score in mapping.items())
+            return added
+
+    def zrem(self, key, *members):
+        with self.lock:
+            z = self.zsets.get(key, {})
+            return sum(z.pop(m.encode(), None) is not None for m in members)
+
+    def zrangebyscore(self, key, min, max, start=None, num=None):
+        with self.lock:
+            items = sorted((score, m) for m, score in self.zsets.get(key, {}).items()
+                           if float(min) <= score <= float(max))
+        members = [m for _, m in items]
+        if start is not None:
+            members = members[start:start + num]
+        return members
+
+
+def open_store(url, load=None):
+    """
+    "memory" (default), "local" (RedisRoomStore on LocalRedis) or a Redis
+    URL such as redis://localhost:6379/0 (needs the redis package).
+    """
+    if not url or url == "memory":
+        return MemoryRoomStore(load)
+    if url == "local":
+        return RedisRoomStore(LocalRedis(), load=load)
+    import redis  # pip install redis
+    return RedisRoomStore(redis.Redis.from_url(url), load=load)
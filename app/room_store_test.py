@@ -0,0 +1,121 @@
+import threading
+import time
+import chess
+import room_store
+
+def test_redis_store_shares_rooms():
+    client = room_store.LocalRedis()
+    a = room_store.RedisRoomStore(client)
+    b = room_store.RedisRoomStore(client)   # a second server process
+
+    with a.room("g") as room:
+        room["board"].push_uci("e2e4")
+        room["last_move"] = chess.Move.from_uci("e2e4")
+        room["players"]["sid1"] = "white"
+        room["slots"]["white"] = "sid1"
+    with b.room("g") as room:
+        assert(room["board"].fen() == chess.Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1").fen())
+        room["board"].push_uci("e7e5")
+    with a.room("g") as room:
+        assert(len(room["board"].move_stack) == 2 and room["players"] == {"sid1": "white"})
+        assert(room["slots"] == {"white": "sid1", "black": None})
+        room["board"].pop()
+    assert(a.room_ids() == ["g"])
+
+def test_redis_store_lock():
+    store = room_store.RedisRoomStore(room_store.LocalRedis(), lock_timeout_s=0.05)
+    with store.room("g"):
+        try:
+            with store.room("g"):
+                assert(False)
+        except TimeoutError:
+            pass
+    with store.room("g") as room:   # released again
+        assert(room["board"].move_stack == [])
+
+def test_close_room():
+    for store in (room_store.MemoryRoomStore(), room_store.RedisRoomStore(room_store.LocalRedis())):
+        with store.room("g", create=False) as room:
+            assert(room is None)
+        with store.room("g") as room:
+            pass
+        assert(store.exists("g") and store.count() == 1)
+        with store.room("g") as room:
+            room["closed"] = True
+        assert(not store.exists("g") and store.room_ids() == [])
+
+def test_idle_index():
+    for store in (room_store.MemoryRoomStore(), room_store.RedisRoomStore(room_store.LocalRedis())):
+        for room_id, touched in [("b", 20.0), ("a", 10.0), ("c", 30.0)]:
+            with store.room(room_id) as room:
+                room["touched"] = touched
+        with store.room("c") as room:
+            room["players"]["sid1"] = "white"   # not idle
+        with store.room("a") as room:
+            pass                                 # looking keeps its place
+        assert(store.idle_rooms() == ["a", "b"])
+        assert(store.idle_rooms(before=15.0) == ["a"] and store.idle_rooms(limit=1) == ["a"])
+        with store.room("a") as room:
+            room["closed"] = True
+        assert(store.idle_rooms() == ["b"])
+
+def test_expired_lock_loses_the_room():
+    client = room_store.LocalRedis()
+    a = room_store.RedisRoomStore(client, lock_ttl_s=0.05)
+    b = room_store.RedisRoomStore(client, lock_ttl_s=5)
+    with a.room("g"):
+        pass
+    lock = a._key("g") + ":lock"
+
+    # a's lock expires mid-block and b takes the room: a must not delete
+    # b's lock or save over the room
+    a_block = a.room("g")
+    a_block.__enter__()["board"].push_uci("e2e4")
+    time.sleep(0.1)
+    b_block = b.room("g")
+    b_block.__enter__()["board"].push_uci("d2d4")
+    b_lock = client.get(lock)
+    try:
+        a_block.__exit__(None, None, None)
+        assert(False)
+    except room_store.RoomLockLost:
+        pass
+    assert(client.get(lock) == b_lock)
+    b_block.__exit__(None, None, None)
+
+    # a's lock expires, b saves a newer version first: a's stale save fails
+    a_block = a.room("g")
+    a_block.__enter__()["board"].push_uci("e7e5")
+    time.sleep(0.1)
+    with b.room("g") as room:
+        room["board"].push_uci("d7d5")
+    try:
+        a_block.__exit__(None, None, None)
+        assert(False)
+    except room_store.RoomLockLost:
+        pass
+    with a.room("g") as room:
+        assert([m.uci() for m in room["board"].move_stack] == ["d2d4", "d7d5"])
+
+def test_load_holds_only_its_own_room():
+    started, release = threading.Event(), threading.Event()
+    def load(room_id):
+        if room_id == "slow":
+            started.set()
+            release.wait(5)     # a long move log replay
+        return None
+    store = room_store.MemoryRoomStore(load)
+
+    def use(room_id):
+        with store.room(room_id):
+            pass
+    slow = threading.Thread(target=use, args=("slow",))
+    slow.start()
+    started.wait(5)
+    fast = threading.Thread(target=use, args=("fast",))
+    fast.start()
+    fast.join(1)
+    done = not fast.is_alive()
+    release.set()
+    slow.join()
+    assert(done and sorted(store.room_ids()) == ["fast", "slow"])
@@ -0,0 +1,45 @@
+# wire.py — compact Socket.IO payloads
+# With SERIALIZER=msgpack the server and its Python clients exchange
+# msgpack frames instead of JSON text (smaller, and cheaper to encode and
+# parse on the Pi), and moves travel packed into two bytes instead of UCI
+# strings:
+#   bits 0-5   from square (0 = a1 … 63 = h8)
+#   bits 6-11  to square
+#   bits 12-14 promotion piece type (0 none, 2 knight … 5 queen)
+# big-endian, so b"\x07\x0c" is e2e4. Clients must use the same serializer
+# as the server (browsers load socket.io-msgpack-parser, see index.html).
+
+import struct
+
+import chess
+
+SERIALIZERS = ("json", "msgpack")
+
+_MOVE = struct.Struct(">H")
+
+
+def socketio_serializer(name):
+    """python-socketio serializer option for SERIALIZER."""
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer '{name}' (use {' or '.join(SERIALIZERS)})")
+    return "msgpack" if name == "msgpack" else "default"
+
+
+def pack_move(move):
+    return _MOVE.pack(move.from_square | move.to_square << 6 | (move.promotion or 0) << 12)
+
+
+def unpack_move(data):
+    if len(data) != _MOVE.size:
+        raise ValueError(f"Packed move must be {_MOVE.size} bytes")
+    value, = _MOVE.unpack(data)
+    return chess.Move(value & 63, value >> 6 & 63, value >> 12 or None)
+
+
+def read_move(value):
+    """A move field as sent by either serializer (UCI text or two bytes), or None."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return unpack_move(value)
+    return chess.Move.from_uci(value)
@@ -0,0 +1,15 @@
+import chess
+import wire
+
+def test_packed_moves():
+    assert(wire.pack_move(chess.Move.from_uci("e2e4")) == b"\x07\x0c")
+    for uci in ["e2e4", "a7a8q", "h2h1n", "h8a1"]:
+        move = chess.Move.from_uci(uci)
+        assert(wire.read_move(wire.pack_move(move)) == move)
+        assert(wire.read_move(uci) == move)
+    assert(wire.read_move(None) is None)
+    try:
+        wire.unpack_move(b"\x07")
+        assert(False)
+    except ValueError:
+        pass
@@ -0,0 +1,156 @@
+# bench_motion.py — how long does the gantry take to play a game?
+# Replays PGN games through the same calls the server makes (move_piece,
+# capture_then_move_piece, run_job for castling / en passant) against the
+# SimDriver, so nothing moves and a whole game runs in well under a second.
+# Per game it reports:
+#   • mechanical time (virtual clock: STEP_DELAY per pulse edge, corner dwell,
+#     deceleration ramps — everything the real gantry would wait for)
+#   • pulses per motor and empty travel (pulses with the magnet off, in tiles)
+#   • magnet-on time and coil load (full-duty-equivalent seconds, a heating proxy)
+# Run it before and after a planner / profile change and compare the totals.
+#
+#   python bench_motion.py                  # bench_games.pgn next to this file
+#   python bench_motion.py games.pgn --json
+#
+# Needs python-chess (pip install chess) to read the PGN.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import chess
+import chess.pgn
+
+import drivers
+import piece_movement_algorithm as pma
+
+DEFAULT_PGN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_games.pgn")
+
+
+def move_relocations(board: chess.Board, move: chess.Move) -> List[Tuple[str, str]]:
+    """
+    Relocations for a move that is not a plain move or capture
+    (castling: king + rook, en passant: pawn off the board + pawn move).
+    """
+    start = chess.square_name(move.from_square).upper()
+    end = chess.square_name(move.to_square).upper()
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        kingside = chess.square_file(move.to_square) > chess.square_file(move.from_square)
+        rook_from = chess.square_name(chess.square(7 if kingside else 0, rank)).upper()
+        rook_to = chess.square_name(chess.square(5 if kingside else 3, rank)).upper()
+        return [(start, end), (rook_from, rook_to)]
+    if board.is_en_passant(move):
+        taken = chess.square_name(chess.square(chess.square_file(move.to_square),
+                                               chess.square_rank(move.from_square))).upper()
+        return [(taken, pma.RACK), (start, end)]
+    return [(start, end)]
+
+
+def play_move(board: chess.Board, move: chess.Move):
+    start = chess.square_name(move.from_square).upper()
+    end = chess.square_name(move.to_square).upper()
+    if board.is_castling(move) or board.is_en_passant(move):
+        pma.run_job(move_relocations(board, move))
+    elif board.is_capture(move):
+        pma.capture_then_move_piece(start, end, board.piece_at(move.to_square).symbol())
+    else:
+        pma.move_piece(start, end)
+
+
+def bench_game(game: chess.pgn.Game, sim: drivers.SimDriver) -> dict:
+    """Play one game from the start position on a fresh simulated gantry."""
+    sim.reset()
+    pma.gantry.x_steps = pma.gantry.y_steps = 0
+    pma.rack_contents.clear()
+    pma.capture_index = 0
+
+    board = game.board()
+    moves = 0
+    error = None
+    cpu0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            for move in game.mainline_moves():
+                play_move(board, move)
+                board.push(move)
+                moves += 1
+        except Exception as e:
+            error = f"{board.fullmove_number}. {board.san(move)}: {e}"
+    cpu_s = time.perf_counter() - cpu0
+
+    s = sim.summary()
+    return {
+        "game": f"{game.headers.get('White', '?')} - {game.headers.get('Black', '?')}",
+        "moves": moves,
+        "time_s": round(s["time_s"], 3),
+        "s_per_move": round(s["time_s"] / moves, 3) if moves else 0.0,
+        "pulses_a": s["pulses_a"],
+        "pulses_b": s["pulses_b"],
+        "empty_tiles": round(s["empty_pulses"] / pma.STEPS_PER_TILE, 2),
+        "magnet_on_s": round(s["magnet_on_s"], 3),
+        "magnet_duty_s": round(s["magnet_duty_s"], 3),
+        "cpu_s": round(cpu_s, 3),
+        "error": error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated gantry time per chess game")
+    parser.add_argument("pgn", nargs="?", default=DEFAULT_PGN, help="PGN file with one or more games")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    sim = pma.use_driver(drivers.SimDriver(record_steps=False))
+    with contextlib.redirect_stdout(io.StringIO()):
+        pma.load_path_cache()
+
+    results = []
+    with open(args.pgn) as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            results.append(bench_game(game, sim))
+
+    profile = {
+        "step_delay_s": pma.STEP_DELAY,
+        "corner_dwell_s": pma.CORNER_DWELL_S,
+        "steps_per_tile": pma.STEPS_PER_TILE,
+        "stop_decel_steps": pma.STOP_DECEL_STEPS,
+        "stop_decel_factor": pma.STOP_DECEL_FACTOR,
+        "mag_duty_hold": pma.MAG_DUTY_HOLD,
+        "mag_boost_s": pma.MAG_BOOST_S,
+        "mag_release_s": pma.MAG_RELEASE_S,
+    }
+    totals = {k: round(sum(r[k] for r in results), 3)
+              for k in ("moves", "time_s", "pulses_a", "pulses_b", "empty_tiles", "magnet_on_s",
+                        "magnet_duty_s", "cpu_s")}
+
+    if args.json:
+        json.dump({"profile": profile, "games": results, "total": totals}, sys.stdout, indent=2)
+        print()
+        return
+
+    print("Profile: " + ", ".join(f"{k}={v}" for k, v in profile.items()))
+    print(f"{'game':<40} {'moves':>5} {'time s':>8} {'s/move':>7} {'pulses A':>9} {'pulses B':>9} "
+          f"{'empty tiles':>11} {'magnet s':>9} {'coil s':>8} {'cpu s':>6}")
+    for r in results:
+        print(f"{r['game'][:40]:<40} {r['moves']:>5} {r['time_s']:>8.1f} {r['s_per_move']:>7.2f} "
+              f"{r['pulses_a']:>9} {r['pulses_b']:>9} {r['empty_tiles']:>11.1f} "
+              f"{r['magnet_on_s']:>9.1f} {r['magnet_duty_s']:>8.1f} {r['cpu_s']:>6.2f}")
+        if r["error"]:
+            print(f"    stopped at {r['error']}")
+    per_move = totals["time_s"] / totals["moves"] if totals["moves"] else 0.0
+    print(f"{'total':<40} {totals['moves']:>5} {totals['time_s']:>8.1f} {per_move:>7.2f} "
+          f"{totals['pulses_a']:>9} {totals['pulses_b']:>9} {totals['empty_tiles']:>11.1f} "
+          f"{totals['magnet_on_s']:>9.1f} {totals['magnet_duty_s']:>8.1f} {totals['cpu_s']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# calibrate.py — find how fast this gantry can run without losing steps
+# Ramps speed (step delay) and acceleration (ramp length) upward on a test
+# pattern that runs out and back along X and Y from the A1 center. After each
+# trial the carriage should be exactly back where it started; a skipped step
+# shows up as an offset from the A1 mark:
+#   • on the Pi you are asked to look (y = back on the mark, n = it is off)
+#   • with CHESSBOT_DRIVER=sim the simulated motors are checked instead
+#     (--yes runs without prompts; it is refused on real hardware, where
+#     nothing but your eyes can check the mark)
+# An out-and-back pattern only shows net step loss: steps lost equally on
+# the way out and on the way back cancel, so a trial can pass while every
+# leg is short. The --margin slow-down is there partly for that.
+# For every speed the shortest ramp that passes is kept, and the search stops
+# at the first speed where no ramp passes. The fastest passing profile is
+# slowed down by --margin and saved to gantry_profile.json, which
+# piece_movement_algorithm.py and motor_control.py load at startup.
+#
+#   python3 calibrate.py                    # carriage centered on A1 first
+#   python3 calibrate.py --carry            # with a piece on A1 (magnet on)
+#   CHESSBOT_DRIVER=sim python3 calibrate.py --yes
+
+import argparse
+import os
+import time
+
+import drivers
+import motion
+import piece_movement_algorithm as pma
+
+START_DELAY = 0.004          # s; slowest step delay tried (and ramp start speed)
+MIN_DELAY = 0.0006           # s; never try faster than this
+SPEEDUP = 0.85               # next step delay = previous × SPEEDUP
+RAMPS = (120, 60, 30, 0)     # ramp lengths tried per speed, gentlest first
+PATTERN_TILES = 6            # how far out each leg goes
+REPEATS = 2                  # out-and-back cycles per trial
+
+
+def run_pattern(gantry: motion.Gantry, carry: bool):
+    """Out and back along X, then along Y, REPEATS times; ends where it started."""
+    out_x = gantry.tiles_to_steps_x(PATTERN_TILES)
+    out_y = gantry.tiles_to_steps_y(PATTERN_TILES)
+    gantry.enable(True)
+    if carry:
+        gantry.mag_on()
+    try:
+        for _ in range(REPEATS):
+            for dx, dy in ((out_x, 0), (-out_x, 0), (0, out_y), (0, -out_y)):
+                gantry.move_steps(dx, dy)
+    finally:
+        gantry.mag_off()
+        gantry.enable(False)
+
+
+def back_on_mark(gantry: motion.Gantry) -> bool:
+    """
+    Did the trial end on the A1 mark? Only net loss is visible: steps lost
+    symmetrically out and back cancel (see the header).
+    """
+    driver = gantry.driver
+    if isinstance(driver, drivers.SimDriver):
+        return driver.net == [0, 0]
+    return input("  Carriage back exactly on the A1 mark? [y/n] ").strip().lower().startswith("y")
+
+
+def calibrate(gantry: motion.Gantry, carry: bool):
+    """Fastest passing (step_delay, ramp_steps), or None if even the slowest fails."""
+    base = gantry.config
+    best = None
+    delay = START_DELAY
+    while delay >= MIN_DELAY:
+        passed = None
+        # Starting at START_DELAY there is nothing to ramp from
+        for ramp in (RAMPS if delay < START_DELAY else (0,)):
+            gantry.config = base._replace(step_delay=delay, start_delay=START_DELAY, ramp_steps=ramp)
+            print(f"[Cal] step delay {delay * 1e3:.3f} ms, ramp {ramp} steps ...")
+            t0 = gantry.driver.now()
+            run_pattern(gantry, carry)
+            elapsed = gantry.driver.now() - t0
+            if not back_on_mark(gantry):
+                print("  Lost steps. Center the carriage on A1 again, then press Enter.")
+                if not isinstance(gantry.driver, drivers.SimDriver):
+                    input()
+                break
+            print(f"  OK ({elapsed:.1f} s)")
+            passed = ramp
+        if passed is None:
+            break
+        best = (delay, passed)
+        delay *= SPEEDUP
+
+    gantry.config = base
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate gantry speed and acceleration")
+    parser.add_argument("--margin", type=float, default=0.25,
+                        help="slow the fastest passing profile down by this fraction (default 0.25)")
+    parser.add_argument("--carry", action="store_true", help="run the pattern with the magnet on")
+    parser.add_argument("--yes", action="store_true",
+                        help="no prompts (CHESSBOT_DRIVER=sim only, where the motors are checked)")
+    parser.add_argument("--out", default=pma.PROFILE_FILE, help="profile file to write")
+    args = parser.parse_args()
+
+    driver = drivers.make_driver(os.environ.get("CHESSBOT_DRIVER", "gpio"), pma.PINS)
+    if args.yes and not isinstance(driver, drivers.SimDriver):
+        driver.cleanup()
+        parser.error("--yes needs CHESSBOT_DRIVER=sim: on the gantry every trial has to be checked by eye")
+    gantry = motion.Gantry(pma.CONFIG, driver)
+    print("Center the carriage on A1 before starting.")
+    try:
+        best = calibrate(gantry, args.carry)
+    finally:
+        gantry.driver.cleanup()
+
+    if best is None:
+        print(f"[Cal] Even {START_DELAY * 1e3:.1f} ms per step loses steps — check belts and current limits.")
+        return
+
+    delay, ramp = best
+    profile = pma.CONFIG._replace(
+        step_delay=round(min(START_DELAY, delay * (1 + args.margin)), 6),
+        start_delay=START_DELAY,
+        ramp_steps=int(round(ramp * (1 + args.margin))),
+    )
+    motion.save_profile(profile, args.out,
+                        fastest_step_delay=delay, fastest_ramp_steps=ramp,
+                        margin=args.margin, carry=args.carry,
+                        calibrated=time.strftime("%Y-%m-%d %H:%M:%S"))
+    print(f"[Cal] Fastest safe: {delay * 1e3:.3f} ms/step, ramp {ramp}. "
+          f"Saved {profile.step_delay * 1e3:.3f} ms/step, ramp {profile.ramp_steps} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
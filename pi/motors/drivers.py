@@ -0,0 +1,211 @@
+# drivers.py — hardware abstraction for the gantry (two steppers + magnet)
+# The motion scripts talk to a driver object instead of RPi.GPIO, so they can
+# be imported, tested and benchmarked on any Linux box:
+#   • GpioDriver — the real DRV8825s and XY-MOS magnet driver on the Pi
+#                  (RPi.GPIO is only imported when this driver is created)
+#   • SimDriver  — records everything against a virtual clock, without sleeping:
+#                  pulses and net steps per motor, step timestamps, magnet duty,
+#                  and how many pulses ran with the magnet off (empty travel)
+#   • NullDriver — does nothing and never sleeps
+# Pick one with make_driver("gpio" | "sim" | "null"); the scripts read the
+# CHESSBOT_DRIVER environment variable (default "gpio").
+
+import array
+import time
+from typing import List, NamedTuple, Tuple
+
+
+class Pins(NamedTuple):
+    """BCM pin numbers (defaults match the chessbot wiring)."""
+    dir1: int = 26      # Motor A (left)
+    step1: int = 19
+    dir2: int = 16      # Motor B (right)
+    step2: int = 12
+    en1: int = 6        # DRV8825 EN (active-low)
+    en2: int = 5
+    mag: int = 18       # PWM input on XY-MOS
+    mag_freq: int = 1000
+
+
+class Driver:
+    """
+    Interface used by the motion code. Motors are 0 (A) and 1 (B); `level`
+    is the raw DIR pin level (inversions are handled by the caller).
+    """
+
+    def enable(self, on: bool):
+        pass
+
+    def set_dir(self, motor: int, level: bool):
+        pass
+
+    def step(self, step_a: bool, step_b: bool, step_delay: float):
+        """One STEP pulse on the selected motors: HIGH for step_delay, LOW for step_delay."""
+        pass
+
+    def set_magnet(self, duty: float):
+        """Magnet PWM duty in % (0 = off)."""
+        pass
+
+    def sleep(self, seconds: float):
+        pass
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def cleanup(self):
+        pass
+
+
+class NullDriver(Driver):
+    """Accepts every command and does nothing."""
+
+
+class GpioDriver(Driver):
+    def __init__(self, pins: Pins = Pins()):
+        import RPi.GPIO as GPIO  # only available on the Pi
+
+        self.GPIO = GPIO
+        self.pins = pins
+        GPIO.setmode(GPIO.BCM)
+        for p in (pins.dir1, pins.step1, pins.dir2, pins.step2, pins.en1, pins.en2):
+            GPIO.setup(p, GPIO.OUT, initial=GPIO.LOW)
+        GPIO.output(pins.en1, GPIO.HIGH)  # disabled at idle
+        GPIO.output(pins.en2, GPIO.HIGH)
+
+        GPIO.setup(pins.mag, GPIO.OUT, initial=GPIO.LOW)
+        self._mag_pwm = GPIO.PWM(pins.mag, pins.mag_freq)
+        self._mag_pwm.start(0)  # off at idle
+
+    def enable(self, on: bool):
+        GPIO = self.GPIO
+        GPIO.output(self.pins.en1, GPIO.LOW if on else GPIO.HIGH)
+        GPIO.output(self.pins.en2, GPIO.LOW if on else GPIO.HIGH)
+
+    def set_dir(self, motor: int, level: bool):
+        pin = self.pins.dir1 if motor == 0 else self.pins.dir2
+        self.GPIO.output(pin, self.GPIO.HIGH if level else self.GPIO.LOW)
+
+    def step(self, step_a: bool, step_b: bool, step_delay: float):
+        GPIO = self.GPIO
+        if step_a:
+            GPIO.output(self.pins.step1, GPIO.HIGH)
+        if step_b:
+            GPIO.output(self.pins.step2, GPIO.HIGH)
+        time.sleep(step_delay)
+        if step_a:
+            GPIO.output(self.pins.step1, GPIO.LOW)
+        if step_b:
+            GPIO.output(self.pins.step2, GPIO.LOW)
+        time.sleep(step_delay)
+
+    def set_magnet(self, duty: float):
+        self._mag_pwm.ChangeDutyCycle(duty)
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def cleanup(self):
+        # Always leave hardware safe
+        try:
+            self._mag_pwm.ChangeDutyCycle(0)
+            self._mag_pwm.stop()
+        except Exception:
+            pass
+        try:
+            self.GPIO.output(self.pins.en1, self.GPIO.HIGH)
+            self.GPIO.output(self.pins.en2, self.GPIO.HIGH)
+        except Exception:
+            pass
+        self.GPIO.cleanup()
+
+
+class SimDriver(Driver):
+    """
+    Recording simulator. Time only advances through step() and sleep(), so a
+    whole game "runs" in milliseconds while still measuring mechanical time.
+    """
+
+    def __init__(self, record_steps: bool = True):
+        self.record_steps = record_steps
+        self.reset()
+
+    def reset(self):
+        self.clock = 0.0
+        self.enabled = False
+        self.levels = [True, True]
+        self.pulses = [0, 0]             # pulses issued per motor
+        self.net = [0, 0]                # signed steps per motor (DIR HIGH = +1)
+        self.empty_pulses = 0            # pulses issued with the magnet off
+        self.step_times = array.array('d')   # rising edge of every pulse
+        self.magnet_duty = 0.0
+        self.magnet_log: List[Tuple[float, float]] = [(0.0, 0.0)]  # (time, duty)
+        self.magnet_on_s = 0.0           # time with duty > 0
+        self.magnet_duty_s = 0.0         # ∫ duty/100 dt (full-duty equivalent seconds)
+        self.enabled_s = 0.0
+        self._mag_since = 0.0
+        self._enabled_since = 0.0
+
+    def _account(self):
+        dt = self.clock - self._mag_since
+        if self.magnet_duty > 0:
+            self.magnet_on_s += dt
+            self.magnet_duty_s += dt * self.magnet_duty / 100.0
+        self._mag_since = self.clock
+        if self.enabled:
+            self.enabled_s += self.clock - self._enabled_since
+        self._enabled_since = self.clock
+
+    def enable(self, on: bool):
+        self._account()
+        self.enabled = on
+
+    def set_dir(self, motor: int, level: bool):
+        self.levels[motor] = level
+
+    def step(self, step_a: bool, step_b: bool, step_delay: float):
+        if self.record_steps:
+            self.step_times.append(self.clock)
+        if self.magnet_duty == 0:
+            self.empty_pulses += 1
+        if step_a:
+            self.pulses[0] += 1
+            self.net[0] += 1 if self.levels[0] else -1
+        if step_b:
+            self.pulses[1] += 1
+            self.net[1] += 1 if self.levels[1] else -1
+        self.clock += 2 * step_delay
+
+    def set_magnet(self, duty: float):
+        self._account()
+        self.magnet_duty = duty
+        self.magnet_log.append((self.clock, duty))
+
+    def sleep(self, seconds: float):
+        self.clock += seconds
+
+    def now(self) -> float:
+        return self.clock
+
+    def summary(self) -> dict:
+        self._account()
+        return {
+            "time_s": self.clock,
+            "pulses_a": self.pulses[0],
+            "pulses_b": self.pulses[1],
+            "empty_pulses": self.empty_pulses,
+            "magnet_on_s": self.magnet_on_s,
+            "magnet_duty_s": self.magnet_duty_s,
+            "enabled_s": self.enabled_s,
+        }
+
+
+def make_driver(name: str, pins: Pins = Pins()) -> Driver:
+    name = name.strip().lower()
+    if name == "gpio":
+        return GpioDriver(pins)
+    if name == "sim":
+        return SimDriver()
+    if name == "null":
+        return NullDriver()
+    raise ValueError(f"Unknown driver '{name}' (use gpio, sim or null)")
@@ -0,0 +1,301 @@
+# motion.py — the CoreXY gantry shared by every motor script
+# One Gantry object owns the driver, the carriage position and the step
+# engine; the scripts only differ in their GantryConfig:
+#   • motor_control.py            — interactive tile jogger (REPL)
+#   • piece_movement_algorithm.py — median-lane piece mover (Socket.IO + CLI)
+# Assumptions:
+#   • CoreXY mechanics (A,B) with ΔA=ΔX+ΔY, ΔB=ΔX-ΔY
+#   • (0,0) is wherever the carriage was when the script started (A1 center
+#     for the piece mover); positions are kept in steps from there
+#   • Moves are trajectory.Trajectory buffers (one entry per pulse); the
+#     planners only build pure X or pure Y lines, so |ΔA|==|ΔB|
+# No GPIO here (see drivers.py), so this can be imported (and tested) off the Pi.
+
+import json
+import os
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import drivers
+import trajectory
+
+# ----------------------------- Drive train (FULL STEP) -----------------------------
+MICROSTEP      = 1
+STEPS_PER_REV  = 200         # 1.8° motor
+PULLEY_TEETH   = 20          # GT2-20T
+GT2_PITCH_MM   = 2.0         # 2 mm/tooth
+BELT_PER_REV_MM = PULLEY_TEETH * GT2_PITCH_MM                   # 40 mm/rev
+STEPS_PER_MM   = (STEPS_PER_REV * MICROSTEP) / BELT_PER_REV_MM  # 5.0
+STEPS_PER_IN   = int(round(STEPS_PER_MM * 25.4))                # ≈127
+
+
+class GantryConfig(NamedTuple):
+    """Everything that changes how a move is turned into pulses."""
+    tile_inches: float = 1.6562     # board pitch (center-to-center)
+    x_max_in: float = 14.5          # soft limits (inches from origin)
+    y_max_in: float = 14.0
+    invert_dir1: bool = True        # set if a motor runs opposite
+    invert_dir2: bool = False
+    invert_x: bool = False          # flip X commands (Y is never flipped)
+    step_delay: float = 0.003       # s per HIGH and per LOW; increase if you skip
+    # Magnet schedule: full mag_duty_move to grab a piece (for at least
+    # mag_boost_s), mag_duty_hold while carrying at mag_hold_ref_delay (faster
+    # carries get proportionally more, up to mag_duty_move), then off and a
+    # mag_release_s pause at drop-off so the piece settles before we leave.
+    # There is no release pulse: the XY-MOS switch can only drive current
+    # one way, so there is no reverse kick to knock out remanence; cutting
+    # the PWM and waiting for the field to decay is all the hardware allows.
+    # The defaults keep the magnet at full duty with no pauses.
+    mag_duty_move: float = 100
+    mag_boost_s: float = 0.0
+    mag_duty_hold: float = 100
+    mag_hold_ref_delay: float = 0.003
+    mag_release_s: float = 0.0
+    # Emergency stop: the abort flag is checked every stop_check_steps pulses,
+    # then the carriage ramps down over at most stop_decel_steps pulses (step
+    # delay growing to stop_decel_factor × normal), so a stop never overshoots
+    # by more than stop_check_steps + stop_decel_steps steps.
+    stop_check_steps: int = 8
+    stop_decel_steps: int = 12
+    stop_decel_factor: float = 3.0
+    # Acceleration: step delay falls from start_delay to step_delay over the
+    # first ramp_steps pulses of a move (and back at the end); 0 = no ramp
+    start_delay: float = 0.0
+    ramp_steps: int = 0
+    steps_per_in: int = STEPS_PER_IN
+
+    @property
+    def steps_per_tile(self) -> int:
+        return int(round(self.steps_per_in * self.tile_inches))
+
+    @property
+    def x_max_steps(self) -> int:
+        return int(round(self.steps_per_in * self.x_max_in))
+
+    @property
+    def y_max_steps(self) -> int:
+        return int(round(self.steps_per_in * self.y_max_in))
+
+
+# ----------------------------- Speed profile -----------------------------
+# calibrate.py measures how fast this particular machine can go and saves the
+# result as JSON; the scripts apply it on top of their own GantryConfig.
+PROFILE_KEYS = ("step_delay", "start_delay", "ramp_steps")
+
+
+def load_profile(config: GantryConfig, path: str) -> GantryConfig:
+    """`config` with the speed settings from the profile at `path`, if there is one."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        profile = {k: type(getattr(config, k))(data[k]) for k in PROFILE_KEYS if k in data}
+    except FileNotFoundError:
+        return config
+    except (OSError, ValueError, TypeError) as e:
+        print(f"[Profile] Ignoring {path}: {e}")
+        return config
+    return config._replace(**profile)
+
+
+def save_profile(config: GantryConfig, path: str, **extra):
+    """Write the speed settings of `config` (plus `extra` notes) to `path` atomically."""
+    data = {k: getattr(config, k) for k in PROFILE_KEYS}
+    data.update(extra)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+class MotionAborted(RuntimeError):
+    """An abort was requested while the gantry was moving."""
+
+
+class Gantry:
+    """
+    Carriage position, soft limits and the step engine for one gantry.
+    Set `abort` (from any thread) to stop the running move; it stays set,
+    and every later move raises MotionAborted, until the caller clears it.
+    """
+
+    def __init__(self, config: GantryConfig = GantryConfig(), driver: Optional[drivers.Driver] = None):
+        self.config = config
+        self.driver = driver if driver is not None else drivers.NullDriver()
+        self.steps_per_tile = config.steps_per_tile
+        self.x_max_steps = config.x_max_steps
+        self.y_max_steps = config.y_max_steps
+
+        self.x_steps = 0        # position in steps from the origin
+        self.y_steps = 0
+        self.steps_done = 0     # pulses issued since start (progress reporting)
+        self.in_motion = False  # True while move_steps is pulsing
+        self.abort = threading.Event()
+
+        self.magnet = "off"     # off / boost (grabbing) / hold (carrying)
+        self.magnet_duty = 0.0
+        self._boost_since = 0.0
+
+    # ---- hardware ----
+    def enable(self, on: bool):
+        self.driver.enable(on)
+
+    # ---- magnet ----
+    def _set_magnet(self, duty: float):
+        if duty != self.magnet_duty:
+            self.driver.set_magnet(duty)
+            self.magnet_duty = duty
+
+    def mag_on(self):
+        """Full duty to grab a piece."""
+        if self.magnet != "boost":
+            self._set_magnet(self.config.mag_duty_move)
+            self.magnet = "boost"
+            self._boost_since = self.driver.now()
+
+    def mag_hold(self):
+        """
+        The piece is about to be carried: finish the pickup boost, then let
+        every move set the hold duty for its own speed (see hold_duty).
+        """
+        if self.magnet == "hold":
+            return
+        self.mag_on()
+        left = self.config.mag_boost_s - (self.driver.now() - self._boost_since)
+        if left > 0:
+            self.driver.sleep(left)
+        self.magnet = "hold"
+
+    def hold_duty(self, interval_us: int) -> float:
+        """Magnet duty for carrying at a step delay of interval_us."""
+        cfg = self.config
+        speedup = cfg.mag_hold_ref_delay * 1e6 / interval_us
+        return min(cfg.mag_duty_move, cfg.mag_duty_hold * max(1.0, speedup))
+
+    def mag_off(self):
+        """
+        Release the piece: PWM to 0, then a mag_release_s pause if one was
+        held. No reverse release pulse (the XY-MOS driver is one-way).
+        """
+        held = self.magnet != "off"
+        self.driver.set_magnet(0)
+        self.magnet_duty = 0.0
+        self.magnet = "off"
+        if held and self.config.mag_release_s > 0:
+            self.driver.sleep(self.config.mag_release_s)
+
+    # ---- units ----
+    def tiles_to_steps_x(self, delta_tiles: float) -> int:
+        if self.config.invert_x:
+            delta_tiles = -delta_tiles
+        return int(round(delta_tiles * self.steps_per_tile))
+
+    def tiles_to_steps_y(self, delta_tiles: float) -> int:
+        return int(round(delta_tiles * self.steps_per_tile))
+
+    def tiles(self):
+        """Current position in tiles."""
+        return self.x_steps / self.steps_per_tile, self.y_steps / self.steps_per_tile
+
+    def report(self) -> str:
+        spi = self.config.steps_per_in
+        x_tiles, y_tiles = self.tiles()
+        return (f"Pos ≈ ({self.x_steps / spi:.3f} in, {self.y_steps / spi:.3f} in) | "
+                f"Tiles ≈ ({x_tiles:.3f}, {y_tiles:.3f})")
+
+    # ---- step engine ----
+    def _run(self, traj: trajectory.Trajectory) -> int:
+        """
+        Play a trajectory pulse by pulse. Returns the number of pulses issued,
+        which is short of len(traj) if `abort` got set (after a short
+        deceleration along the same path so a carried piece stays put).
+        """
+        cfg = self.config
+        bits, intervals = traj.bits, traj.intervals
+        n = len(bits)
+
+        # Hot loop: bind everything it touches to locals once per move;
+        # DIR pins are only rewritten when the direction bits change
+        step, set_dir = self.driver.step, self.driver.set_dir
+        aborted = self.abort.is_set
+        inv_a, inv_b = cfg.invert_dir1, cfg.invert_dir2
+        check = cfg.stop_check_steps
+        last = -1
+        step_a = step_b = False
+
+        done = 0
+        while done < n:
+            end = min(done + check, n)
+            decel = 0
+            if aborted():
+                # Ramp down along the same path instead of stopping dead
+                decel = min(cfg.stop_decel_steps, n - done)
+                end = done + decel
+            for i in range(done, end):
+                code = bits[i]
+                if code != last:
+                    set_dir(0, bool(code & trajectory.DIR_A) != inv_a)
+                    set_dir(1, bool(code & trajectory.DIR_B) != inv_b)
+                    step_a = bool(code & trajectory.STEP_A)
+                    step_b = bool(code & trajectory.STEP_B)
+                    last = code
+                delay = intervals[i] / 1e6
+                if decel:
+                    delay *= 1 + (cfg.stop_decel_factor - 1) * (i - done + 1) / decel
+                step(step_a, step_b, delay)
+            self.steps_done += end - done
+            done = end
+            if decel:
+                break
+        return done
+
+    def move(self, traj: trajectory.Trajectory):
+        """
+        Play a trajectory from the current position, checked against the
+        soft limits at its end point (RuntimeError). Raises MotionAborted
+        (with the position updated to where the carriage actually stopped)
+        if an abort comes in.
+        """
+        if self.abort.is_set():
+            raise MotionAborted("Move aborted")
+        target_x, target_y = self.check_limits(*traj.displacement())
+
+        if self.magnet == "hold" and len(traj):
+            self._set_magnet(self.hold_duty(min(traj.intervals)))
+
+        self.in_motion = True
+        try:
+            done = self._run(traj)
+        finally:
+            self.in_motion = False
+
+        if done < len(traj):
+            dx, dy = traj.displacement(done)
+            self.x_steps += dx
+            self.y_steps += dy
+            raise MotionAborted(f"Move aborted after {done}/{len(traj)} steps")
+        self.x_steps = target_x
+        self.y_steps = target_y
+
+    def check_limits(self, dx_steps: int, dy_steps: int) -> Tuple[int, int]:
+        """End point of a move by (dx, dy) steps; RuntimeError if outside the soft limits."""
+        target_x = self.x_steps + dx_steps
+        target_y = self.y_steps + dy_steps
+        if target_x < 0 or target_x > self.x_max_steps:
+            raise RuntimeError("X soft-limit exceeded")
+        if target_y < 0 or target_y > self.y_max_steps:
+            raise RuntimeError("Y soft-limit exceeded")
+        return target_x, target_y
+
+    def line(self, dx_steps: int, dy_steps: int, interval_us: Optional[int] = None) -> trajectory.Trajectory:
+        """Straight move with this gantry's step delay (µs) and acceleration ramp."""
+        cfg = self.config
+        if interval_us is None:
+            interval_us = int(round(cfg.step_delay * 1e6))
+        return trajectory.Trajectory.line(dx_steps, dy_steps, interval_us,
+                                          int(round(cfg.start_delay * 1e6)), cfg.ramp_steps)
+
+    def move_steps(self, dx_steps: int, dy_steps: int, step_delay: Optional[float] = None):
+        """Straight move by steps (see move)."""
+        self.move(self.line(dx_steps, dy_steps,
+                            None if step_delay is None else int(round(step_delay * 1e6))))
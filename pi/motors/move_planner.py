@@ -0,0 +1,168 @@
+# move_planner.py — job-level ordering for batches of piece relocations
+# A job is a list of (source, destination) relocations that should run as one
+# gantry batch (capture + move, castling, board resets, ...).
+#   • A location is a board square ("E4") or a capture rack slot ("R3");
+#     turning a location into tile coordinates is left to the caller
+#   • A relocation can only run once its destination has been vacated by the
+#     relocation that starts there
+#   • Cycles (e.g. two pieces swapping squares) are broken by parking one piece
+#     on a free buffer location first
+#   • Among the relocations that are ready, always pick the one whose pickup is
+#     closest to where the carriage currently is (nearest-neighbour heuristic).
+#     Distance is Manhattan because the carriage always travels X then Y.
+# No GPIO here, so this can be imported (and tested) off the Pi.
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+Relocation = Tuple[str, str]
+Locator = Callable[[str], Tuple[float, float]]
+
+
+def travel_tiles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Empty-travel distance (tiles) between two points for an X-then-Y move."""
+    return abs(b[0] - a[0]) + abs(b[1] - a[1])
+
+
+def order_relocations(relocations: List[Relocation],
+                      start_xy: Tuple[float, float],
+                      locate: Locator,
+                      buffer: Optional[str] = None) -> List[Relocation]:
+    """
+    Return the relocations in execution order.
+
+    relocations: (src, dst) pairs; every src and every dst must be unique.
+    start_xy:    current carriage position in tiles.
+    locate:      maps a location name to (x_tiles, y_tiles).
+    buffer:      free location used to break cycles; a cycle without a buffer
+                 raises ValueError.
+
+    The returned plan may contain extra legs through the buffer.
+    """
+    pending: Dict[str, str] = {}  # src -> dst
+    dsts = set()
+    for src, dst in relocations:
+        if src == dst:
+            continue
+        if src in pending:
+            raise ValueError(f"Location {src} is picked up twice")
+        if dst in dsts:
+            raise ValueError(f"Location {dst} is filled twice")
+        pending[src] = dst
+        dsts.add(dst)
+
+    if buffer is not None and (buffer in pending or buffer in dsts):
+        raise ValueError(f"Buffer {buffer} is used by the job itself")
+
+    plan: List[Relocation] = []
+    cur = start_xy
+    while pending:
+        # Ready = destination is not still holding a piece that has to leave
+        ready = [src for src, dst in pending.items() if dst not in pending]
+
+        if not ready:
+            # Everything left is waiting on something else: a cycle.
+            if buffer is None:
+                raise ValueError("Relocation cycle needs a free buffer location")
+            src = min(pending, key=lambda s: travel_tiles(cur, locate(s)))
+            dst = pending.pop(src)
+            plan.append((src, buffer))
+            pending[buffer] = dst
+            cur = locate(buffer)
+            continue
+
+        src = min(ready, key=lambda s: travel_tiles(cur, locate(s)))
+        dst = pending.pop(src)
+        plan.append((src, dst))
+        cur = locate(dst)
+
+    return plan
+
+
+def empty_travel_tiles(plan: List[Relocation],
+                       start_xy: Tuple[float, float],
+                       locate: Locator) -> float:
+    """Total empty (magnet off) travel of a plan, in tiles."""
+    total = 0.0
+    cur = start_xy
+    for src, dst in plan:
+        total += travel_tiles(cur, locate(src))
+        cur = locate(dst)
+    return total
+
+
+# ----------------------------- Restoring a position -----------------------------
+def is_square(loc: str) -> bool:
+    return len(loc) == 2 and 'A' <= loc[0] <= 'H' and '1' <= loc[1] <= '8'
+
+
+def fen_layout(fen: str) -> Dict[str, str]:
+    """
+    Piece placement of a FEN (only the first field is used) as
+    {square: piece symbol}, e.g. {"E1": "K", "E8": "k", ...}.
+    """
+    placement = fen.strip().split()[0]
+    ranks = placement.split("/")
+    if len(ranks) != 8:
+        raise ValueError(f"Bad FEN '{fen}'")
+
+    layout: Dict[str, str] = {}
+    for i, rank in enumerate(ranks):
+        row = 8 - i
+        col = 0
+        for ch in rank:
+            if ch.isdigit():
+                col += int(ch)
+            elif ch in "pnbrqkPNBRQK":
+                if col > 7:
+                    raise ValueError(f"Bad FEN '{fen}'")
+                layout[f"{chr(ord('A') + col)}{row}"] = ch
+                col += 1
+            else:
+                raise ValueError(f"Bad FEN '{fen}'")
+        if col != 8:
+            raise ValueError(f"Bad FEN '{fen}'")
+    return layout
+
+
+def plan_restore(current: Dict[str, str],
+                 target: Dict[str, str],
+                 locate: Locator,
+                 park: str = "RACK") -> Tuple[List[Relocation], List[str]]:
+    """
+    Relocations that turn the `current` layout into the `target` one.
+
+    current: {location: piece symbol} for board squares and rack slots.
+    target:  {square: piece symbol}.
+    park:    destination for board pieces that are not part of the target.
+
+    Pieces already on the right square stay put. Every other target square
+    gets the closest spare piece with the same symbol (shortest carries
+    first), wherever it is. Returns (relocations, squares nobody could fill).
+    """
+    spare = {loc: p for loc, p in current.items() if target.get(loc) != p}
+    needed = {sq: p for sq, p in target.items() if current.get(sq) != p}
+
+    pairs = sorted(
+        (travel_tiles(locate(src), locate(sq)), src, sq)
+        for sq, p in needed.items()
+        for src, q in spare.items()
+        if q == p
+    )
+
+    relocations: List[Relocation] = []
+    used = set()
+    filled = set()
+    for _, src, sq in pairs:
+        if src in used or sq in filled:
+            continue
+        relocations.append((src, sq))
+        used.add(src)
+        filled.add(sq)
+
+    # Leftover pieces on the board must clear out; leftovers in the rack stay
+    for loc in spare:
+        if loc not in used and is_square(loc):
+            relocations.append((loc, park))
+
+    missing = sorted(sq for sq in needed if sq not in filled)
+    return relocations, missing
@@ -0,0 +1,38 @@
+import pytest
+import move_planner as mp
+
+def locate(loc):
+    if loc.startswith("R"):
+        return (8.5, 0.5 + 0.5 * int(loc[1:]))
+    return (float(ord(loc[0]) - ord('A')), float(int(loc[1]) - 1))
+
+def test_vacate_destination_first():
+    plan = mp.order_relocations([("E4", "E5"), ("E5", "R0")], (0, 0), locate)
+    assert(plan == [("E5", "R0"), ("E4", "E5")])
+
+def test_nearest_pickup_first():
+    plan = mp.order_relocations([("H8", "H7"), ("B1", "B2"), ("D4", "D5")], (0, 0), locate)
+    assert(plan == [("B1", "B2"), ("D4", "D5"), ("H8", "H7")])
+
+def test_cycle_uses_buffer():
+    plan = mp.order_relocations([("E1", "D1"), ("D1", "E1")], (0, 0), locate, buffer="R0")
+    assert(plan == [("D1", "R0"), ("E1", "D1"), ("R0", "E1")])
+
+    with pytest.raises(ValueError):
+        mp.order_relocations([("E1", "D1"), ("D1", "E1")], (0, 0), locate)
+
+def test_fen_layout():
+    layout = mp.fen_layout("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+    assert(len(layout) == 32)
+    assert(layout["E4"] == "P" and "E2" not in layout and layout["D8"] == "q")
+
+def test_plan_restore_uses_rack():
+    current = {"E1": "K", "E8": "k", "D4": "Q", "R0": "q", "R1": "p"}
+    target = {"E1": "K", "E8": "k", "D8": "q", "D1": "Q"}
+    relocations, missing = mp.plan_restore(current, target, locate)
+    assert(sorted(relocations) == [("D4", "D1"), ("R0", "D8")])
+    assert(missing == [])
+
+    relocations, missing = mp.plan_restore({"E1": "K", "A2": "P"}, {"E1": "K", "E8": "k"}, locate)
+    assert(relocations == [("A2", "RACK")])
+    assert(missing == ["E8"])
@@ -0,0 +1,149 @@
+# path_cache.py — precomputed step plans for every (start, end) square pair
+# Planning a carry turns a list of tile segments into motor steps. That is cheap
+# for the median-lane planner, but will not be once obstacle-aware or profiled
+# planners land, so results are cached:
+#   • Empty-board plans for all 64×64 square pairs live in flat arrays
+#     (steps in array('h'), step delays in µs in array('H')), built once and
+#     saved to disk so the service can load them at startup in milliseconds
+#   • Plans for any other occupancy signature (bitmask of occupied squares,
+#     bit = row*8 + col) go through a small LRU dict
+#   • The file header carries a CRC of the motion config, so a stale cache is
+#     rebuilt instead of replayed with the wrong step counts
+# Squares are indexed row*8 + col with A1 = 0, H8 = 63.
+# No GPIO here, so this can be imported (and tested) off the Pi.
+
+import array
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+SQUARES = 64
+MAX_SEGS = 5  # median-lane plans have at most 5 segments
+
+StepSegment = Tuple[int, int, int]  # (dx_steps, dy_steps, step_delay_us)
+Builder = Callable[[int, int, int], List[StepSegment]]  # (start, end, occupancy)
+
+_MAGIC = b"CPC1"
+_HEADER = struct.Struct("<4sIHH")  # magic, config CRC, squares, max segments
+
+
+class PathCache:
+    """
+    Step plans keyed by (start square, end square, occupancy signature).
+    `builder` computes a plan on a miss; `config_key` should change whenever
+    anything that affects step counts or delays changes.
+    """
+
+    def __init__(self, builder: Builder, config_key: str, max_dynamic: int = 256):
+        self.builder = builder
+        self.crc = zlib.crc32(config_key.encode())
+        self.max_dynamic = max_dynamic
+
+        pairs = SQUARES * SQUARES
+        self.counts = array.array('B', bytes(pairs))
+        self.steps = array.array('h', bytes(2 * pairs * MAX_SEGS * 2))    # dx, dy per segment
+        self.delays = array.array('H', bytes(2 * pairs * MAX_SEGS))       # µs per segment
+        self.ready = False
+
+        self.dynamic: "OrderedDict[Tuple[int, int, int], List[StepSegment]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- empty-board table ----
+    def _store(self, start: int, end: int, plan: List[StepSegment]):
+        if len(plan) > MAX_SEGS:
+            raise ValueError(f"Plan {start}->{end} has {len(plan)} segments (max {MAX_SEGS})")
+        pair = start * SQUARES + end
+        self.counts[pair] = len(plan)
+        base = pair * MAX_SEGS
+        for i, (dx, dy, delay_us) in enumerate(plan):
+            self.steps[2 * (base + i)] = dx
+            self.steps[2 * (base + i) + 1] = dy
+            self.delays[base + i] = delay_us
+
+    def _lookup(self, start: int, end: int) -> List[StepSegment]:
+        pair = start * SQUARES + end
+        base = pair * MAX_SEGS
+        steps, delays = self.steps, self.delays
+        return [(steps[2 * (base + i)], steps[2 * (base + i) + 1], delays[base + i])
+                for i in range(self.counts[pair])]
+
+    def build(self):
+        """Plan every empty-board square pair (4096 plans)."""
+        for start in range(SQUARES):
+            for end in range(SQUARES):
+                self._store(start, end, self.builder(start, end, 0))
+        self.ready = True
+
+    # ---- disk ----
+    def save(self, path: str):
+        """Write the empty-board table to `path` (atomically)."""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.crc, SQUARES, MAX_SEGS))
+            self.counts.tofile(f)
+            self.steps.tofile(f)
+            self.delays.tofile(f)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Load the empty-board table from `path`. Returns False (and leaves the
+        cache untouched) if the file is missing, truncated or was built for
+        a different config.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return False
+                magic, crc, squares, max_segs = _HEADER.unpack(header)
+                if (magic, crc, squares, max_segs) != (_MAGIC, self.crc, SQUARES, MAX_SEGS):
+                    return False
+
+                counts = array.array('B')
+                steps = array.array('h')
+                delays = array.array('H')
+                counts.fromfile(f, len(self.counts))
+                steps.fromfile(f, len(self.steps))
+                delays.fromfile(f, len(self.delays))
+        except (OSError, EOFError, struct.error):
+            return False
+
+        self.counts, self.steps, self.delays = counts, steps, delays
+        self.ready = True
+        return True
+
+    def load_or_build(self, path: str) -> str:
+        """Load the table from `path`, or build and save it. Returns what happened."""
+        if self.load(path):
+            return "loaded"
+        self.build()
+        try:
+            self.save(path)
+        except OSError as e:
+            print(f"[Cache] Could not save path cache to {path}: {e}")
+        return "built"
+
+    # ---- lookups ----
+    def get(self, start: int, end: int, occupancy: int = 0) -> List[StepSegment]:
+        """Step plan from square `start` to square `end`."""
+        if occupancy == 0 and self.ready:
+            self.hits += 1
+            return self._lookup(start, end)
+
+        key = (start, end, occupancy)
+        plan = self.dynamic.get(key)
+        if plan is not None:
+            self.dynamic.move_to_end(key)
+            self.hits += 1
+            return plan
+
+        self.misses += 1
+        plan = self.builder(start, end, occupancy)
+        self.dynamic[key] = plan
+        if len(self.dynamic) > self.max_dynamic:
+            self.dynamic.popitem(last=False)
+        return plan
@@ -0,0 +1,26 @@
+import path_cache
+
+def builder(start, end, occupancy):
+    return [(end - start, 0, 3000), (0, occupancy, 2500)]
+
+def test_table_round_trip(tmp_path):
+    cache = path_cache.PathCache(builder, "test")
+    cache.build()
+    assert(cache.get(3, 60) == [(57, 0, 3000), (0, 0, 2500)])
+
+    path = str(tmp_path / "cache.bin")
+    cache.save(path)
+    loaded = path_cache.PathCache(builder, "test")
+    assert(loaded.load(path))
+    assert(loaded.get(60, 3) == [(-57, 0, 3000), (0, 0, 2500)])
+
+    # Different config → stale file is ignored
+    assert(not path_cache.PathCache(builder, "other").load(path))
+
+def test_occupancy_goes_through_lru():
+    cache = path_cache.PathCache(builder, "test", max_dynamic=1)
+    assert(cache.get(0, 1, occupancy=5) == [(1, 0, 3000), (0, 5, 2500)])
+    cache.get(0, 1, occupancy=5)
+    assert((cache.hits, cache.misses) == (1, 1))
+    cache.get(0, 2, occupancy=5)
+    assert(len(cache.dynamic) == 1)
@@ -13,19 +13,44 @@
 #   • Capture handling:
 #       - Remove captured piece from END square to a capture rack along the H-side
 #       - Then move attacking piece START -> END using normal median lane
+#   • Event: "move_job" with payload {"moves": [{"start": "E1", "end": "G1"}, ...]}
+#       - Several relocations executed as one batch (castling, en passant, resets)
+#       - Ordered by move_planner to minimise empty travel between pieces
+#       - "start": "RACK" with a "piece" pulls that piece back out of the rack
+#         (undo of a capture)
+#   • Event: "restore_position" with payload {"current": FEN, "target": FEN}
+#       - Rebuilds the target layout, pulling pieces back out of the capture rack
+#   • Commands are queued and run by one worker thread (see "Motion worker");
+#     "home" queues a return to A1, "abort" drops the queue and stops the gantry
+#     mid-segment (bounded deceleration, position kept, magnet released)
+#   • Position, capture rack and last job id are saved to gantry_state.json
+#     around every move and restored at startup (no re-homing after a restart)
 
-import RPi.GPIO as GPIO
 import time
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import sys
 import socketio  # pip install "python-socketio[client]"
 import signal    # for out-of-band “home” command via SIGUSR1
+import os
+import queue
+import threading
+import itertools
+import contextlib
+
+import drivers
+import motion
+import move_planner
+import path_cache
+import rack
+import state_store
 
 # ----------------------------- Socket.IO config -----------------------------
 # Change this to James' backend URL
 SOCKETIO_SERVER_URL = "http://172.17.88.122:3000"
+# Must match the server's SERIALIZER ("msgpack" needs the msgpack package)
+SOCKETIO_SERIALIZER = os.environ.get("SERIALIZER", "json")
 
-sio = socketio.Client()
+sio = socketio.Client(serializer="msgpack" if SOCKETIO_SERIALIZER == "msgpack" else "default")
 
 # ----------------------------- Pins (BCM) -----------------------------
 DIR1, STEP1 = 26, 19   # Motor A (left)
@@ -35,27 +60,20 @@ EN1,  EN2   = 6, 5     # DRV8825 EN (active-low)
 # Magnet driver (XY-MOS)
 MAG_PIN        = 18     # PWM input on XY-MOS
 MAG_PWM_FREQ   = 1000   # Hz
-MAG_DUTY_MOVE  = 100    # % duty while moving (tune if needed)
+MAG_DUTY_MOVE  = 100    # % duty to grab a piece (tune if needed)
+MAG_BOOST_S    = 0.15   # s; grab at full duty at least this long
+MAG_DUTY_HOLD  = 70     # % duty while carrying at STEP_DELAY (faster carries get more)
+MAG_RELEASE_S  = 0.05   # s; pause after releasing so the piece settles
 
 # ----------------------------- Motion constants -----------------------------
-# Drive train (FULL STEP)
-MICROSTEP      = 1
-STEPS_PER_REV  = 200         # 1.8° motor
-PULLEY_TEETH   = 20          # GT2-20T
-GT2_PITCH_MM   = 2.0         # 2 mm/tooth
-BELT_PER_REV_MM = PULLEY_TEETH * GT2_PITCH_MM         # 40 mm/rev
-STEPS_PER_MM   = (STEPS_PER_REV * MICROSTEP) / BELT_PER_REV_MM  # 5.0
-STEPS_PER_IN   = int(round(STEPS_PER_MM * 25.4))                  # ≈127
+# Drive train (FULL STEP) lives in motion.py
+STEPS_PER_IN   = motion.STEPS_PER_IN                             # ≈127
 
 # Chessboard pitch (center-to-center) — keep your current value
 TILE_INCHES    = 1.6562  # inches
-STEPS_PER_TILE = int(round(STEPS_PER_IN * TILE_INCHES))
-HALF_TILE_STEPS = STEPS_PER_TILE // 2
 
 # Soft limits (inches from origin center A1) — keep generous margins
 X_MAX_IN, Y_MAX_IN = 14.5, 14.0
-X_MAX_STEPS = int(round(STEPS_PER_IN * X_MAX_IN))
-Y_MAX_STEPS = int(round(STEPS_PER_IN * Y_MAX_IN))
 
 # Optional inversions (UNCHANGED)
 INVERT_DIR1 = True
@@ -65,11 +83,55 @@ INVERT_X    = False
 # Step timing: (one HIGH+LOW pair per microstep pulse)
 STEP_DELAY = 0.003   # seconds; increase if you skip
 
+# Emergency stop: the stop flag is checked every STOP_CHECK_STEPS pulses, then
+# the carriage ramps down over at most STOP_DECEL_STEPS pulses (step delay
+# growing to STOP_DECEL_FACTOR × normal), so a stop never overshoots by more
+# than STOP_CHECK_STEPS + STOP_DECEL_STEPS steps (≈0.16 in).
+STOP_CHECK_STEPS  = 8
+STOP_DECEL_STEPS  = 12
+STOP_DECEL_FACTOR = 3.0
+
+CONFIG = motion.GantryConfig(
+    tile_inches=TILE_INCHES,
+    x_max_in=X_MAX_IN, y_max_in=Y_MAX_IN,
+    invert_dir1=INVERT_DIR1, invert_dir2=INVERT_DIR2, invert_x=INVERT_X,
+    step_delay=STEP_DELAY,
+    mag_duty_move=MAG_DUTY_MOVE,
+    mag_boost_s=MAG_BOOST_S,
+    mag_duty_hold=MAG_DUTY_HOLD,
+    mag_hold_ref_delay=STEP_DELAY,
+    mag_release_s=MAG_RELEASE_S,
+    stop_check_steps=STOP_CHECK_STEPS,
+    stop_decel_steps=STOP_DECEL_STEPS,
+    stop_decel_factor=STOP_DECEL_FACTOR,
+)
+# Per-machine speed profile written by calibrate.py (if it has been run)
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gantry_profile.json")
+CONFIG = motion.load_profile(CONFIG, PROFILE_FILE)
+STEP_DELAY = CONFIG.step_delay
+
+STEPS_PER_TILE = CONFIG.steps_per_tile
+HALF_TILE_STEPS = STEPS_PER_TILE // 2
+X_MAX_STEPS = CONFIG.x_max_steps
+Y_MAX_STEPS = CONFIG.y_max_steps
+
+# Pause after each carried segment so the piece settles at corners/centers
+CORNER_DWELL_S = 0.10
+
+# Precomputed square-to-square step plans (rebuilt automatically if the
+# constants above change; delete the file to force a rebuild)
+PATH_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "path_cache.bin")
+
+# Position, rack contents and last job id, kept across service restarts
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gantry_state.json")
+
 # ----------------------------- Capture zone config -----------------------------
 # Capture rack along the H-side (right side of the board).
 # Coordinates are in "tile units" with A1 center = (0,0).
 # We place captured pieces in a vertical column near the H-file, spaced closer
-# than one tile so we can fit many of them.
+# than one tile so we can fit many of them. More columns (either side) can be
+# added to CAPTURE_COLUMNS as long as they fit inside the soft limits; with
+# (0,0) at A1 center only the H-side has room today.
 X_MAX_TILES = X_MAX_STEPS / STEPS_PER_TILE
 Y_MAX_TILES = Y_MAX_STEPS / STEPS_PER_TILE
 
@@ -80,74 +142,71 @@ CAPTURE_MAX_SLOTS        = int(
     (Y_MAX_TILES - CAPTURE_Y_START_TILES) // CAPTURE_Y_SPACING_TILES
 )
 
-capture_index = 0  # how many pieces have been parked so far
-
-# ----------------------------- GPIO setup -----------------------------
-GPIO.setmode(GPIO.BCM)
-for p in (DIR1, STEP1, DIR2, STEP2, EN1, EN2):
-    GPIO.setup(p, GPIO.OUT, initial=GPIO.LOW)
-GPIO.output(EN1, GPIO.HIGH)  # disabled at idle
-GPIO.output(EN2, GPIO.HIGH)
+CAPTURE_COLUMNS = [
+    rack.RackColumn("H-side", CAPTURE_X_TILES, CAPTURE_Y_START_TILES, CAPTURE_Y_SPACING_TILES, CAPTURE_MAX_SLOTS),
+]
 
-GPIO.setup(MAG_PIN, GPIO.OUT, initial=GPIO.LOW)
-_mag_pwm = GPIO.PWM(MAG_PIN, MAG_PWM_FREQ)
-_mag_pwm.start(0)  # off at idle
+capture_rack = rack.Rack(CAPTURE_COLUMNS)
+for _x, _y in capture_rack.slots:
+    # The median lane overshoots a slot by +0.5 tile in Y before dropping in
+    if not (0 <= _x <= X_MAX_TILES and 0 <= _y and _y + 0.5 <= Y_MAX_TILES):
+        raise ValueError(f"Capture slot at ({_x}, {_y}) tiles is outside the soft limits")
 
-# ----------------------------- Kinematics helpers -----------------------------
-x_pos_steps = 0  # “world” position in steps from A1 center
-y_pos_steps = 0
+capture_index = 0  # how many pieces are parked right now
+rack_contents = capture_rack.contents  # slot ('R3') -> piece symbol, None if unknown
 
-def _enable_drives(on: bool):
-    GPIO.output(EN1, GPIO.LOW if on else GPIO.HIGH)
-    GPIO.output(EN2, GPIO.LOW if on else GPIO.HIGH)
+# ----------------------------- Gantry -----------------------------
+# Position, soft limits and the step engine live in one motion.Gantry; all
+# pin / PWM / sleep calls go through its driver (see drivers.py). Nothing
+# touches hardware until use_driver() is called, so the module imports off
+# the Pi; the script entry picks CHESSBOT_DRIVER (gpio, sim or null).
+# Set gantry.abort ("abort" / SIGUSR1) to stop the running move.
+PINS = drivers.Pins(DIR1, STEP1, DIR2, STEP2, EN1, EN2, MAG_PIN, MAG_PWM_FREQ)
 
-def _set_dir(pin: int, cw: bool, invert: bool = False):
-    GPIO.output(pin, GPIO.HIGH if (cw != invert) else GPIO.LOW)
+gantry = motion.Gantry(CONFIG)
+MotionAborted = motion.MotionAborted
 
-def _pulse(step_a: bool, step_b: bool):
-    if step_a:
-        GPIO.output(STEP1, GPIO.HIGH)
-    if step_b:
-        GPIO.output(STEP2, GPIO.HIGH)
-    time.sleep(STEP_DELAY)
-    if step_a:
-        GPIO.output(STEP1, GPIO.LOW)
-    if step_b:
-        GPIO.output(STEP2, GPIO.LOW)
-    time.sleep(STEP_DELAY)
+def use_driver(new_driver) -> drivers.Driver:
+    """Select the hardware driver: a name ('gpio', 'sim', 'null') or a Driver."""
+    if isinstance(new_driver, str):
+        new_driver = drivers.make_driver(new_driver, PINS)
+    gantry.driver = new_driver
+    return new_driver
 
-def _move_corexy(dx_steps: int, dy_steps: int):
-    """
-    Execute a straight move in carriage X/Y. For our path we only issue
-    pure X or pure Y segments, so |ΔA|==|ΔB| and a simple loop suffices.
-    """
-    dA = dx_steps + dy_steps
-    dB = dx_steps - dy_steps
-
-    _set_dir(DIR1, (dA >= 0), invert=INVERT_DIR1)
-    _set_dir(DIR2, (dB >= 0), invert=INVERT_DIR2)
-
-    steps = max(abs(dA), abs(dB))
-    step_a = (dA != 0)
-    step_b = (dB != 0)
-
-    for _ in range(steps):
-        _pulse(step_a, step_b)
-
-def _mag_on():
-    _mag_pwm.ChangeDutyCycle(MAG_DUTY_MOVE)
-
-def _mag_off():
-    _mag_pwm.ChangeDutyCycle(0)
+_home_pending = False       # CLI mode: SIGUSR1 arrived mid-move, home once stopped
+_cli_busy = False           # CLI mode: a command is running (pulsing, dwelling or holding)
 
 # ----------------------------- Unit conversions -----------------------------
-def tiles_to_steps_x(delta_tiles: float) -> int:
-    if INVERT_X:
-        delta_tiles = -delta_tiles
-    return int(round(delta_tiles * STEPS_PER_TILE))
+def _y_delta_steps(cur_y_steps: int, delta_tiles: float) -> int:
+    """Y tile delta in steps, from cur_y_steps (includes the snap near origin)."""
+    dy = gantry.tiles_to_steps_y(delta_tiles)
+    target = cur_y_steps + dy
 
-def tiles_to_steps_y(delta_tiles: float) -> int:
-    return int(round(delta_tiles * STEPS_PER_TILE))
+    # --- Rounding safety near origin ---
+    # If we're within ±2 steps of 0, just snap to exactly 0
+    if -2 <= target <= 2:
+        dy = -cur_y_steps   # move exactly back to 0
+    return dy
+
+def segments_to_steps(segments: List[Tuple[str, float]],
+                      x0_steps: int, y0_steps: int) -> List[Tuple[int, int]]:
+    """
+    Turn tile segments into (dx_steps, dy_steps) moves, starting from
+    (x0_steps, y0_steps). Rounds exactly like move_x_tiles / move_y_tiles.
+    Zero-tile segments are dropped.
+    """
+    y = y0_steps
+    moves: List[Tuple[int, int]] = []
+    for axis, tiles in segments:
+        if tiles == 0:
+            continue
+        if axis == "X":
+            moves.append((gantry.tiles_to_steps_x(tiles), 0))
+        else:
+            dy = _y_delta_steps(y, tiles)
+            moves.append((0, dy))
+            y += dy
+    return moves
 
 # ----------------------------- Chess helpers -----------------------------
 def parse_square(sq: str) -> Tuple[int, int]:
@@ -168,34 +227,17 @@ def center_of_square_tiles(col0: int, row0: int) -> Tuple[float, float]:
     """
     return float(col0), float(row0)
 
+def square_name(col0: int, row0: int) -> str:
+    return f"{chr(ord('A') + col0)}{row0 + 1}"
+
 # ----------------------------- Motion primitives -----------------------------
 def move_x_tiles(delta_tiles: float):
     """Pure X move by tiles (can be fractional)."""
-    global x_pos_steps
-    dx = tiles_to_steps_x(delta_tiles)
-    target = x_pos_steps + dx
-    if target < 0 or target > X_MAX_STEPS:
-        raise RuntimeError("X soft-limit exceeded")
-    _move_corexy(dx_steps=dx, dy_steps=0)
-    x_pos_steps = target
+    gantry.move_steps(gantry.tiles_to_steps_x(delta_tiles), 0)
 
 def move_y_tiles(delta_tiles: float):
     """Pure Y move by tiles (can be fractional)."""
-    global y_pos_steps
-    dy = tiles_to_steps_y(delta_tiles)
-    target = y_pos_steps + dy
-
-    # --- Rounding safety near origin ---
-    # If we're within ±2 steps of 0, just snap to exactly 0
-    if -2 <= target <= 2:
-        dy = -y_pos_steps   # move exactly back to 0
-        target = 0
-
-    if target < 0 or target > Y_MAX_STEPS:
-        raise RuntimeError("Y soft-limit exceeded")
-
-    _move_corexy(dx_steps=0, dy_steps=dy)
-    y_pos_steps = target
+    gantry.move_steps(0, _y_delta_steps(gantry.y_steps, delta_tiles))
 
 def go_to_square_center(col0: int, row0: int):
     """
@@ -203,13 +245,12 @@ def go_to_square_center(col0: int, row0: int):
     using straight X then Y. Simple and safe (no carry).
     """
     cx, cy = center_of_square_tiles(col0, row0)
-    cur_x_tiles = x_pos_steps / STEPS_PER_TILE
-    cur_y_tiles = y_pos_steps / STEPS_PER_TILE
+    cur_x_tiles, cur_y_tiles = gantry.tiles()
 
-    _enable_drives(True)
+    gantry.enable(True)
     move_x_tiles(cx - cur_x_tiles)
     move_y_tiles(cy - cur_y_tiles)
-    _enable_drives(False)
+    gantry.enable(False)
 
 def _sign(v: float) -> int:
     return (v > 0) - (v < 0)
@@ -221,14 +262,20 @@ def approach_square_with_early_magnet(col0: int, row0: int, early_tiles: float =
     still X then Y; we just split the last leg into [leg - early] + [early].
     """
     cx, cy = center_of_square_tiles(col0, row0)
-    cur_x_tiles = x_pos_steps / STEPS_PER_TILE
-    cur_y_tiles = y_pos_steps / STEPS_PER_TILE
+    approach_tiles_with_early_magnet(cx, cy, early_tiles)
+
+def approach_tiles_with_early_magnet(cx: float, cy: float, early_tiles: float = 0.5):
+    """
+    Same as approach_square_with_early_magnet, but to an arbitrary tile
+    coordinate (used to pick pieces back up from the capture rack).
+    """
+    cur_x_tiles, cur_y_tiles = gantry.tiles()
 
     dx = cx - cur_x_tiles
     dy = cy - cur_y_tiles
 
-    _enable_drives(True)
-    _mag_off()  # ensure we start this approach with magnet off
+    gantry.enable(True)
+    gantry.mag_off()  # ensure we start this approach with magnet off
 
     # Always keep axis order: X then Y.
     if abs(dy) > 1e-6:
@@ -244,11 +291,11 @@ def approach_square_with_early_magnet(col0: int, row0: int, early_tiles: float =
             if abs(lead_y) > 1e-6:
                 move_y_tiles(lead_y)
             # Turn magnet on for the last early_tiles as we slide under the piece
-            _mag_on()
+            gantry.mag_on()
             move_y_tiles(sgn_y * early_tiles)
         else:
             # Short Y move: just turn magnet on for the whole Y leg
-            _mag_on()
+            gantry.mag_on()
             move_y_tiles(dy)
     else:
         # --- No Y leg; use X as the final leg ---
@@ -257,15 +304,15 @@ def approach_square_with_early_magnet(col0: int, row0: int, early_tiles: float =
             lead_x = dx - sgn_x * early_tiles
             if abs(lead_x) > 1e-6:
                 move_x_tiles(lead_x)
-            _mag_on()
+            gantry.mag_on()
             move_x_tiles(sgn_x * early_tiles)
         else:
             # Already very close: just engage magnet and finish X
-            _mag_on()
+            gantry.mag_on()
             if abs(dx) > 1e-6:
                 move_x_tiles(dx)
 
-    _enable_drives(False)
+    gantry.enable(False)
     # IMPORTANT: leave magnet ON so the next move (median path) starts with
     # the piece already held.
 
@@ -295,7 +342,7 @@ def plan_median_xfirst(start_sq: str, end_sq: str) -> List[Tuple[str, float]]:
     segs.append(("Y", dy))                   # long Y while in aisle
     if s != 0:
         segs.append(("X", 0.5 * s))          # step sideways into column center
-    segs.append(("Y", -0.7))                # drop into destination center
+    segs.append(("Y", -min(0.7, ye + 0.5)))  # drop into destination center (not past Y soft-limit)
     return segs
 
 def plan_median_from_current_to_target_tiles(target_x_tiles: float,
@@ -304,8 +351,7 @@ def plan_median_from_current_to_target_tiles(target_x_tiles: float,
     Same median-lane idea, but from the *current* carriage position (in tiles)
     to an arbitrary tile coordinate (used for capture rack).
     """
-    cur_x_tiles = x_pos_steps / STEPS_PER_TILE
-    cur_y_tiles = y_pos_steps / STEPS_PER_TILE
+    cur_x_tiles, cur_y_tiles = gantry.tiles()
 
     dx = target_x_tiles - cur_x_tiles
     dy = target_y_tiles - cur_y_tiles
@@ -317,43 +363,174 @@ def plan_median_from_current_to_target_tiles(target_x_tiles: float,
     segs.append(("Y", dy))                   # long Y in aisle
     if s != 0:
         segs.append(("X", 0.5 * s))          # side hop toward target center
-    segs.append(("Y", -0.7))                # drop down toward target
+    segs.append(("Y", -min(0.7, target_y_tiles + 0.5)))  # drop down toward target
     return segs
 
-def execute_segments_with_piece(segments: List[Tuple[str, float]], corner_dwell_s: float = 0.10):
+def execute_segments_with_piece(segments: List[Tuple[str, float]], corner_dwell_s: Optional[float] = None):
     """
     Execute a preplanned list of axis-aligned segments while holding the piece.
     Magnet is on during this path (usually already engaged slightly before call).
     """
-    _enable_drives(True)
-    _mag_on()
+    step_delay_us = int(round(STEP_DELAY * 1e6))
+    moves = segments_to_steps(segments, gantry.x_steps, gantry.y_steps)
+    execute_steps_with_piece([(dx, dy, step_delay_us) for dx, dy in moves], corner_dwell_s)
+
+def execute_steps_with_piece(moves: List[path_cache.StepSegment], corner_dwell_s: Optional[float] = None):
+    """
+    Same as execute_segments_with_piece, for a plan already in steps:
+    (dx_steps, dy_steps, step_delay_us) per segment.
+    """
+    if corner_dwell_s is None:
+        corner_dwell_s = CORNER_DWELL_S
+    gantry.enable(True)
+    gantry.mag_hold()  # boost is finished, carry at hold duty
     try:
-        for axis, tiles in segments:
-            if tiles == 0:
-                continue
-            if axis == "X":
-                move_x_tiles(tiles)
-            else:
-                move_y_tiles(tiles)
-            time.sleep(corner_dwell_s)  # settle at corners/centers
+        for dx, dy, step_delay_us in moves:
+            gantry.move(gantry.line(dx, dy, step_delay_us))
+            gantry.driver.sleep(corner_dwell_s)  # settle at corners/centers
     finally:
-        _mag_off()
-        _enable_drives(False)
+        gantry.mag_off()
+        gantry.enable(False)
+
+# ----------------------------- Path cache -----------------------------
+def _plan_steps(start: int, end: int, occupancy: int = 0) -> List[path_cache.StepSegment]:
+    """
+    Path cache builder: median-lane plan from square index `start` to `end`
+    (row*8 + col), in steps from the start square center. The median-lane
+    planner ignores `occupancy`.
+    """
+    cs, rs = start % 8, start // 8
+    ce, re = end % 8, end // 8
+    segs = plan_median_xfirst(square_name(cs, rs), square_name(ce, re))
+    step_delay_us = int(round(STEP_DELAY * 1e6))
+    moves = segments_to_steps(segs, gantry.tiles_to_steps_x(cs), gantry.tiles_to_steps_y(rs))
+    return [(dx, dy, step_delay_us) for dx, dy in moves]
+
+_path_cache = path_cache.PathCache(
+    _plan_steps,
+    config_key=f"median-v1:{STEPS_PER_TILE}:{INVERT_X}:{STEP_DELAY}",
+)
+
+def load_path_cache():
+    t0 = time.perf_counter()
+    how = _path_cache.load_or_build(PATH_CACHE_FILE)
+    print(f"[Cache] Path cache {how} in {(time.perf_counter() - t0) * 1000:.1f} ms")
 
 # ----------------------------- Capture rack helpers -----------------------------
+def capture_slot_tiles(index: int) -> Tuple[float, float]:
+    """
+    Position of capture rack slot `index` as (x_tiles, y_tiles).
+    """
+    return capture_rack.slot_tiles(f"R{index}")
+
+def free_capture_slot(near: Optional[Tuple[float, float]] = None) -> Optional[str]:
+    """
+    Free capture slot closest to `near` (default: the carriage), or None if
+    the rack is full.
+    """
+    return capture_rack.nearest_free(near if near is not None else current_tiles())
+
+def alloc_capture_slot(piece: Optional[str] = None, near: Optional[Tuple[float, float]] = None) -> str:
+    """
+    Allocate the free capture slot closest to `near` (default: the carriage),
+    i.e. the shortest carry for a piece picked up there.
+    Returns the slot as a location name ('R0', 'R1', ...).
+    """
+    global capture_index
+    slot = capture_rack.allocate(near if near is not None else current_tiles(), piece)
+    capture_index = len(rack_contents)
+    return slot
+
+def reserve_capture_slot(near: Optional[Tuple[float, float]] = None) -> str:
+    """
+    Like alloc_capture_slot, but the slot only counts as holding a piece once
+    capture_rack.fill() records the carry; capture_rack.release() frees it.
+    """
+    return capture_rack.reserve(near if near is not None else current_tiles())
+
 def alloc_capture_slot_tiles() -> Tuple[float, float]:
     """
-    Allocate the next capture position along the H-side capture rack.
+    Allocate the capture slot closest to the carriage.
     Returns target (x_tiles, y_tiles).
     """
-    global capture_index
-    if capture_index >= CAPTURE_MAX_SLOTS:
-        raise RuntimeError("Capture zone is full")
+    return location_tiles(alloc_capture_slot())
 
-    cx = CAPTURE_X_TILES
-    cy = CAPTURE_Y_START_TILES + capture_index * CAPTURE_Y_SPACING_TILES
-    capture_index += 1
-    return cx, cy
+# ----------------------------- Locations -----------------------------
+# A location is either a board square ("E4") or a capture rack slot ("R3").
+# "RACK" as a destination means "the next free capture slot"; as the start
+# of a job move it means "that piece, back out of the rack" (see
+# resolve_rack_pickups).
+RACK = "RACK"
+
+def location_tiles(loc: str) -> Tuple[float, float]:
+    """
+    Convert a location name to (x_tiles, y_tiles) with A1 center = (0,0).
+    """
+    loc = loc.strip().upper()
+    if loc.startswith("R"):
+        return capture_rack.slot_tiles(loc)
+    return center_of_square_tiles(*parse_square(loc))
+
+def current_tiles() -> Tuple[float, float]:
+    return gantry.tiles()
+
+# ----------------------------- Persistent state -----------------------------
+# Saved to STATE_FILE before and after every move (see state_store.py) and
+# loaded at startup, so a restarted service carries on without re-homing.
+# Nothing is written until load_state() is called (CLI / Socket.IO modes).
+_state = state_store.StateStore(
+    STATE_FILE,
+    config_key=f"{STEPS_PER_TILE}:{INVERT_X}:{capture_rack.signature()}",
+)
+_persist = False
+_last_job_id = 0  # last job the worker finished (job ids carry on from here)
+
+def save_state(moving: bool = False):
+    if not _persist:
+        return
+    try:
+        _state.save({
+            "x_steps": gantry.x_steps,
+            "y_steps": gantry.y_steps,
+            "rack": rack_contents,
+            "last_job_id": _last_job_id,
+            "moving": moving,
+        })
+    except OSError as e:
+        print(f"[State] Could not save {STATE_FILE}: {e}")
+
+def load_state():
+    """Resume position, rack and job ids from STATE_FILE, and keep it up to date from now on."""
+    global _persist, capture_index, _last_job_id, _job_ids
+    _persist = True
+    data = _state.load()
+    if data is None:
+        print("[State] No saved state. Assuming carriage is homed at A1 center (0,0).")
+        save_state()
+        return
+
+    gantry.x_steps = int(data["x_steps"])
+    gantry.y_steps = int(data["y_steps"])
+    rack_contents.clear()
+    rack_contents.update(data.get("rack", {}))
+    capture_index = len(rack_contents)
+    _last_job_id = int(data.get("last_job_id", 0))
+    _job_ids = itertools.count(_last_job_id + 1)
+
+    print(f"[State] Resumed after job {_last_job_id}: {len(rack_contents)} piece(s) in the rack.")
+    report()
+    if data.get("moving"):
+        print("[State] WARNING: the last run stopped in the middle of a move. "
+              "The carriage may not be where it thinks it is — check it (and the piece) and home.")
+
+@contextlib.contextmanager
+def _tracked_move():
+    """Mark the saved state as mid-move while the body runs."""
+    save_state(moving=True)
+    try:
+        yield
+    finally:
+        save_state()
 
 # ----------------------------- High-level: move one piece -----------------------------
 def move_piece(start_sq: str, end_sq: str):
@@ -367,18 +544,136 @@ def move_piece(start_sq: str, end_sq: str):
     cs, rs = parse_square(start_sq)
     ce, re = parse_square(end_sq)
 
-    # 1) Travel to start with early magnet engagement
-    print(f"[Go] Moving empty carriage to {start_sq} (magnet will turn on ~0.5 tile early)...")
-    approach_square_with_early_magnet(cs, rs, early_tiles=0.5)
-    print(f"[Pick] At {start_sq} with magnet engaged. Moving to {end_sq} via medians...")
+    with _tracked_move():
+        # 1) Travel to start with early magnet engagement
+        print(f"[Go] Moving empty carriage to {start_sq} (magnet will turn on ~0.5 tile early)...")
+        approach_square_with_early_magnet(cs, rs, early_tiles=0.5)
+        print(f"[Pick] At {start_sq} with magnet engaged. Moving to {end_sq} via medians...")
+
+        # 2) Plan + 3) Execute (cached plans assume we start on the square center)
+        if (gantry.x_steps, gantry.y_steps) == (gantry.tiles_to_steps_x(cs), gantry.tiles_to_steps_y(rs)):
+            execute_steps_with_piece(_path_cache.get(rs * 8 + cs, re * 8 + ce))
+        else:
+            execute_segments_with_piece(plan_median_xfirst(start_sq, end_sq))
+
+        print(f"[Done] Reached {end_sq}. Magnet released.")
+
+def relocate_piece(src: str, dst: str):
+    """
+    Pick up the piece at location `src` and carry it to location `dst`
+    (board squares or capture rack slots, see location_tiles).
+    """
+    sx, sy = location_tiles(src)
+    print(f"[Go] Moving empty carriage to {src}...")
+    approach_tiles_with_early_magnet(sx, sy, early_tiles=0.5)
 
-    # 2) Plan + 3) Execute
-    segs = plan_median_xfirst(start_sq, end_sq)
+    dx, dy = location_tiles(dst)
+    print(f"[Pick] At {src} with magnet engaged. Carrying to {dst} via medians...")
+    segs = plan_median_from_current_to_target_tiles(dx, dy)
     execute_segments_with_piece(segs)
+    print(f"[Done] Reached {dst}. Magnet released.")
 
-    print(f"[Done] Reached {end_sq}. Magnet released.")
+def run_job(relocations: List[Tuple[str, str]], pieces: Optional[Dict[str, str]] = None):
+    """
+    Execute several relocations as one batch.
+      1) Validate every location, then reserve real slots for "RACK"
+         destinations (recorded as full only once the piece is there)
+      2) Order the relocations with move_planner (vacate squares first,
+         nearest pickup next, cycles parked on a spare rack slot)
+      3) Execute them back to back
+
+    pieces optionally maps a source location to the piece symbol standing
+    there, so the rack knows what it holds (needed to restore positions).
+    """
+    global capture_index
+    job = [(src.strip().upper(), dst.strip().upper()) for src, dst in relocations]
+    for src, dst in job:
+        location_tiles(src)
+        if dst != RACK:
+            location_tiles(dst)
+
+    labels = {loc.strip().upper(): p for loc, p in (pieces or {}).items()}
+    reserved = []
+    try:
+        for i, (src, dst) in enumerate(job):
+            if dst == RACK:
+                reserved.append(reserve_capture_slot(near=location_tiles(src)))
+                job[i] = (src, reserved[-1])
+
+        # Free slot nearest the carriage doubles as the cycle buffer
+        buffer = free_capture_slot()
+        plan = move_planner.order_relocations(job, current_tiles(), location_tiles, buffer)
+
+        empty = move_planner.empty_travel_tiles(plan, current_tiles(), location_tiles)
+        print(f"[Job] {len(plan)} relocation(s), ≈{empty:.1f} tiles of empty travel: "
+              + ", ".join(f"{src}->{dst}" for src, dst in plan))
+        for src, dst in plan:
+            with _tracked_move():
+                relocate_piece(src, dst)
+
+                # Keep track of what the rack holds (only after the carry succeeded)
+                piece = rack_contents.pop(src, None) if src in rack_contents else labels.pop(src, None)
+                if dst.startswith("R"):
+                    capture_rack.fill(dst, piece)
+                else:
+                    labels[dst] = piece
+                capture_index = len(rack_contents)
+    finally:
+        # Aborted or failed part way: slots never reached are free again
+        for slot in reserved:
+            capture_rack.release(slot)
 
-def capture_then_move_piece(start_sq: str, end_sq: str):
+def resolve_rack_pickups(moves: List[Tuple[str, str, Optional[str]]]) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Turn "RACK" starts in (start, end, piece) moves into the rack slot holding
+    that piece, the one closest to where it is going (undo pulls a captured
+    piece back this way). Moves whose piece is not in the rack are dropped.
+    """
+    taken = set()
+    resolved = []
+    for src, dst, piece in moves:
+        if src == RACK:
+            slot = capture_rack.find(piece, near=location_tiles(dst), exclude=taken) if piece else None
+            if slot is None:
+                print(f"[Job] No '{piece}' in the capture rack for {dst} — place it by hand.")
+                continue
+            taken.add(slot)
+            src = slot
+        resolved.append((src, dst, piece))
+    return resolved
+
+def plan_restore_position(current_fen: str, target_fen: str):
+    """
+    Relocations for restore_position. Returns (relocations, current layout
+    including known rack slots, target squares nothing could fill).
+    """
+    current: Dict[str, str] = move_planner.fen_layout(current_fen)
+    current.update({slot: piece for slot, piece in rack_contents.items() if piece})
+    target = move_planner.fen_layout(target_fen)
+
+    relocations, missing = move_planner.plan_restore(current, target, location_tiles, park=RACK)
+    return relocations, current, missing
+
+def restore_position(current_fen: str, target_fen: str, plan=None):
+    """
+    Rebuild the `target_fen` piece layout on the physical board, assuming the
+    board currently matches `current_fen`. Pieces missing from the board are
+    recovered from the capture rack (only slots whose piece is known);
+    pieces that are not part of the target are parked in the rack.
+    `plan` is plan_restore_position's result for the same FENs, if the
+    caller already has it.
+    """
+    relocations, current, missing = plan or plan_restore_position(current_fen, target_fen)
+    if missing:
+        print(f"[Restore] No piece available for {', '.join(missing)} — place them by hand.")
+    if not relocations:
+        print("[Restore] Board already matches the target.")
+        return
+
+    print(f"[Restore] {len(relocations)} relocation(s) to reach target layout...")
+    run_job(relocations, pieces=current)
+
+def capture_then_move_piece(start_sq: str, end_sq: str, captured: Optional[str] = None):
     """
     Capture sequence:
       1) Go to END square first, pick up the piece being captured.
@@ -386,21 +681,11 @@ def capture_then_move_piece(start_sq: str, end_sq: str):
       3) Then move the attacking piece from START -> END using the normal median path.
 
     This avoids ever trying to have two pieces in the same square under the magnet.
+    Runs as one job, so the attacker is picked up straight from the rack.
+    `captured` is the captured piece's symbol, if known, for the rack record.
     """
-    # --- 1) Remove and park the captured piece ---
-    ce, re = parse_square(end_sq)
-    print(f"[Cap] Moving to {end_sq} to pick up captured piece...")
-    approach_square_with_early_magnet(ce, re, early_tiles=0.5)
-
-    cx, cy = alloc_capture_slot_tiles()
-    print(f"[Cap] Carrying captured piece from {end_sq} to capture rack at "
-          f"({cx:.2f} tiles, {cy:.2f} tiles)...")
-    segs = plan_median_from_current_to_target_tiles(cx, cy)
-    execute_segments_with_piece(segs)
-    print(f"[Cap] Captured piece parked. Now moving attacker {start_sq} -> {end_sq}...")
-
-    # --- 2) Move the attacking piece into the now-empty square ---
-    move_piece(start_sq, end_sq)
+    pieces = {end_sq: captured} if captured else None
+    run_job([(end_sq, RACK), (start_sq, end_sq)], pieces=pieces)
 
 def go_home_a1():
     """
@@ -408,27 +693,39 @@ def go_home_a1():
     This assumes the software position is still accurate (no skipped steps).
     """
     print("[Home] Returning to A1 center (A1)...")
-    _mag_off()  # make sure we're not holding a piece
+    gantry.mag_off()  # make sure we're not holding a piece
     # A1 is (col,row) = (0,0)
-    go_to_square_center(0, 0)
+    with _tracked_move():
+        go_to_square_center(0, 0)
     print("[Home] At A1 center.")
 
 # ----------------------------- Diagnostics -----------------------------
 def report():
-    x_in = x_pos_steps / STEPS_PER_IN
-    y_in = y_pos_steps / STEPS_PER_IN
-    print(
-        f"Pos ≈ ({x_in:.3f} in, {y_in:.3f} in) | "
-        f"Tiles ≈ ({x_pos_steps / STEPS_PER_TILE:.3f}, {y_pos_steps / STEPS_PER_TILE:.3f})"
-    )
+    print(gantry.report())
 
 # ----------------------------- Signal handler for “home” -----------------
 def _handle_sigusr1(signum, frame):
     """
     Systemd / OS-level “home” command:
     Send SIGUSR1 to this process to return carriage to A1 center.
+
+    Anything that is moving is stopped first (never a second move on top of
+    a running one):
+      • Socket.IO mode: abort the queue, then queue the home move
+      • CLI mode mid-command: stop it; the CLI homes once it has unwound.
+        "Mid-command" is the whole move, not just the pulses (gantry.in_motion
+        is False during corner dwells and magnet pauses)
     """
+    global _home_pending
     print("\n[SIG] SIGUSR1 received — homing carriage to A1...")
+    if _worker_started:
+        on_abort()
+        _enqueue("home", {})
+        return
+    if _cli_busy or gantry.in_motion:
+        gantry.abort.set()
+        _home_pending = True
+        return
     try:
         go_home_a1()
         report()
@@ -440,23 +737,14 @@ signal.signal(signal.SIGUSR1, _handle_sigusr1)
 
 # ----------------------------- Hardware cleanup -----------------------------
 def hardware_cleanup():
-    # Always leave hardware safe
-    try:
-        _mag_off()
-        _mag_pwm.stop()
-    except Exception:
-        pass
-    try:
-        GPIO.output(EN1, GPIO.HIGH)
-        GPIO.output(EN2, GPIO.HIGH)
-    except Exception:
-        pass
-    GPIO.cleanup()
+    # Always leave hardware safe (the driver turns the magnet and drives off)
+    gantry.driver.cleanup()
 
 # ----------------------------- CLI mode (old behavior) -----------------------------
 def run_cli_mode():
     print(f"Config: steps/in={STEPS_PER_IN}, steps/tile≈{STEPS_PER_TILE} (tile={TILE_INCHES}\")")
-    print("Assuming carriage is homed at A1 center (0,0).")
+    load_path_cache()
+    load_state()
     print('Enter moves as "E4, E5" for normal moves or "E4xE5" for captures.')
     print('Commands: pos, home, quit')
 
@@ -472,8 +760,13 @@ def run_cli_mode():
             report()
             continue
         if low in ("h", "home", "origin", "a1"):
-            go_home_a1()
-            report()
+            try:
+                with _cli_command():
+                    go_home_a1()
+                report()
+            except MotionAborted as e:
+                print(f"[ABORT] {e}")
+                _stop_after_abort()
             continue
 
         capture_flag = False
@@ -499,14 +792,209 @@ def run_cli_mode():
                 continue
 
         try:
-            if capture_flag:
-                capture_then_move_piece(start_sq, end_sq)
-            else:
-                move_piece(start_sq, end_sq)
+            with _cli_command():
+                if capture_flag:
+                    capture_then_move_piece(start_sq, end_sq)
+                else:
+                    move_piece(start_sq, end_sq)
             report()
+        except MotionAborted as e:
+            print(f"[ABORT] {e}")
+            _stop_after_abort()
         except Exception as e:
             print(f"[ERROR] {e}")
 
+@contextlib.contextmanager
+def _cli_command():
+    """CLI mode: mark a command as running, so SIGUSR1 stops it instead of homing on top of it."""
+    global _cli_busy
+    _cli_busy = True
+    try:
+        yield
+    finally:
+        _cli_busy = False
+    if _home_pending:
+        # SIGUSR1 came in after the last step: nothing left to stop, just home
+        _stop_after_abort()
+
+def _stop_after_abort():
+    """CLI mode: make the hardware safe after a stop, then home if asked to."""
+    global _home_pending
+    gantry.abort.clear()
+    gantry.mag_off()
+    gantry.enable(False)
+    report()
+    if _home_pending:
+        _home_pending = False
+        go_home_a1()
+        report()
+
+# ----------------------------- Motion worker -----------------------------
+# Socket.IO handlers only validate and queue commands; one worker thread owns
+# the gantry, so pings, new commands, progress and aborts keep flowing while
+# a move is executing.
+#   • Every queued command is acked right away: "move_piece_queued"
+#     {"job_id": 7, "kind": "move_piece", "queued": 1}
+#   • While it runs: "move_piece_progress" {"job_id", "kind", "percent", "eta_s"}
+#   • When it ends: "<kind>_done" with "job_id" and "status" ok/error/aborted
+PROGRESS_INTERVAL_S = 0.5
+MEDIAN_DETOUR_TILES = 1.7   # extra travel of a median-lane carry (+0.5 Y, ±0.5 X, -0.7 Y)
+
+_jobs: "queue.Queue[Tuple[int, str, dict]]" = queue.Queue()
+_job_added = threading.Event()
+# Held by on_abort while it drains the queue and raises the abort flag, and
+# by the worker while it takes the next job and clears the flag: an abort
+# either drops a job before it starts or stops it once it runs, never lost
+_jobs_lock = threading.Lock()
+_job_ids = itertools.count(1)
+_worker_started = False
+_active_job: Optional[dict] = None  # job_id/kind/started/steps_at_start/total_steps
+
+def _estimate_steps(relocations: List[Tuple[str, str]]) -> int:
+    """Rough step count for a list of relocations (progress/ETA only)."""
+    cur = current_tiles()
+    tiles = 0.0
+    for src, dst in relocations:
+        s = location_tiles(src)
+        if dst.strip().upper() == RACK:
+            d = location_tiles(free_capture_slot(s) or "R0")
+        else:
+            d = location_tiles(dst)
+        tiles += move_planner.travel_tiles(cur, s) + move_planner.travel_tiles(s, d) + MEDIAN_DETOUR_TILES
+        cur = d
+    return int(tiles * STEPS_PER_TILE)
+
+def _begin_progress(total_steps: int):
+    job = _active_job
+    if job is not None:
+        job["total_steps"] = total_steps
+
+def _progress_reporter():
+    """Background thread: emit move_piece_progress for the running job."""
+    while True:
+        time.sleep(PROGRESS_INTERVAL_S)
+        job = _active_job
+        if job is None or not job["total_steps"]:
+            continue
+        done = gantry.steps_done - job["steps_at_start"]
+        total = max(job["total_steps"], done)
+        elapsed = gantry.driver.now() - job["started"]
+        if done:
+            eta = elapsed * (total - done) / done
+        else:
+            eta = total * 2 * STEP_DELAY
+        try:
+            sio.emit("move_piece_progress", {
+                "job_id": job["job_id"],
+                "kind": job["kind"],
+                "percent": min(99, int(100 * done / total)),
+                "eta_s": round(eta, 1),
+            })
+        except Exception:
+            pass
+
+def _run_move_piece(data: dict):
+    start_sq, end_sq = data["start"], data["end"]
+    if data["capture"]:
+        _begin_progress(_estimate_steps([(end_sq, RACK), (start_sq, end_sq)]))
+        capture_then_move_piece(start_sq, end_sq, data.get("piece"))
+    else:
+        _begin_progress(_estimate_steps([(start_sq, end_sq)]))
+        move_piece(start_sq, end_sq)
+
+def _run_move_job(data: dict):
+    moves = resolve_rack_pickups([(m["start"], m["end"], m.get("piece")) for m in data["moves"]])
+    relocations = [(src, dst) for src, dst, _ in moves]
+    pieces = {src: piece for src, _, piece in moves if piece}
+    _begin_progress(_estimate_steps(relocations))
+    run_job(relocations, pieces=pieces)
+
+def _run_restore_position(data: dict):
+    plan = plan_restore_position(data["current"], data["target"])
+    _begin_progress(_estimate_steps(plan[0]))
+    restore_position(data["current"], data["target"], plan=plan)
+
+def _run_home(data: dict):
+    _begin_progress(int(move_planner.travel_tiles(current_tiles(), (0.0, 0.0)) * STEPS_PER_TILE))
+    go_home_a1()
+
+_RUNNERS = {
+    "move_piece": _run_move_piece,
+    "move_job": _run_move_job,
+    "restore_position": _run_restore_position,
+    "home": _run_home,
+}
+
+def _stamp(data: dict, stage: str):
+    """Add a wall-clock timestamp to the job's move trace, if it carries one."""
+    trace = data.get("trace")
+    if isinstance(trace, dict) and isinstance(trace.get("stamps"), list):
+        trace["stamps"].append([stage, time.time()])
+
+def _emit_done(kind: str, payload: dict):
+    try:
+        sio.emit(f"{kind}_done", payload)
+    except Exception:
+        pass
+
+def _enqueue(kind: str, data: dict) -> dict:
+    job_id = next(_job_ids)
+    _jobs.put((job_id, kind, data))
+    _job_added.set()
+    ack = {"job_id": job_id, "kind": kind, "queued": _jobs.qsize()}
+    print(f"[NET] Queued {kind} as job {job_id} ({ack['queued']} waiting)")
+    try:
+        sio.emit("move_piece_queued", ack)
+    except Exception:
+        pass
+    return ack
+
+def _motion_worker():
+    """Worker thread: run queued commands one at a time."""
+    global _active_job, _last_job_id
+    while True:
+        _job_added.clear()
+        with _jobs_lock:
+            try:
+                job_id, kind, data = _jobs.get_nowait()
+            except queue.Empty:
+                job_id = None
+            else:
+                gantry.abort.clear()
+                _active_job = {
+                    "job_id": job_id,
+                    "kind": kind,
+                    "started": gantry.driver.now(),
+                    "steps_at_start": gantry.steps_done,
+                    "total_steps": 0,
+                }
+        if job_id is None:
+            _job_added.wait()
+            continue
+        _stamp(data, "pi_start")
+        try:
+            _RUNNERS[kind](data)
+            report()
+            status = {"status": "ok"}
+        except MotionAborted as e:
+            print(f"[ABORT] Job {job_id} ({kind}) aborted.")
+            status = {"status": "aborted", "message": str(e)}
+        except Exception as e:
+            print(f"[NET ERROR] {e}")
+            status = {"status": "error", "message": str(e)}
+        finally:
+            _active_job = None
+
+        if status["status"] != "ok":
+            # Never leave a piece hanging off the magnet or the drives energized
+            gantry.mag_off()
+            gantry.enable(False)
+            report()
+        _last_job_id = job_id
+        save_state()
+        _stamp(data, "pi_done")
+        _emit_done(kind, {"job_id": job_id, **data, **status})
+
 # ----------------------------- Socket.IO handlers -----------------------------
 @sio.event
 def connect():
@@ -520,53 +1008,137 @@ def disconnect():
 def on_move_piece(data):
     """
     Expected payload shape:
-        { "start": "E4", "end": "E5", "capture": "false" }
+        { "start": "E4", "end": "E5", "capture": false, "piece": "p" }
+
+    An optional "trace" ({"id": ..., "stamps": [[stage, time], ...]}) is
+    stamped on arrival, start and finish and sent back with move_piece_done.
 
     If capture is true, we:
       1) Remove the piece on 'end' to the capture rack
       2) Then move the piece from 'start' to 'end'
+    "piece" (optional) is the symbol of the captured piece.
     """
     try:
         start_sq = data.get("start", "").strip().upper()
         end_sq   = data.get("end", "").strip().upper()
-        capture_flag = str(data.get("capture", "")).lower() == "true"
-        print(data.get("capture"))
+        capture_flag = str(data.get("capture", "")).lower() == "true"  # bool, or "true" from older servers
+        captured = data.get("piece") or None
 
         print(f"[NET] Received move_piece: {start_sq} -> {end_sq} (capture={capture_flag})")
 
-        # Validate squares before moving
+        # Validate squares before queueing
         parse_square(start_sq)
         parse_square(end_sq)
+    except Exception as e:
+        print(f"[NET ERROR] {e}")
+        _emit_done("move_piece", {
+            "start": data.get("start"),
+            "end": data.get("end"),
+            "capture": data.get("capture"),
+            "status": "error",
+            "message": str(e),
+        })
+        return None
+
+    job = {
+        "start": start_sq,
+        "end": end_sq,
+        "capture": capture_flag,
+        "piece": captured,
+    }
+    if data.get("trace") is not None:
+        job["trace"] = data["trace"]
+        _stamp(job, "pi_received")
+    return _enqueue("move_piece", job)
+
+@sio.on("move_job")
+def on_move_job(data):
+    """
+    Expected payload shape:
+        { "moves": [ {"start": "E1", "end": "G1"}, {"start": "H1", "end": "F1"} ] }
 
-        if capture_flag:
-            capture_then_move_piece(start_sq, end_sq)
-        else:
-            move_piece(start_sq, end_sq)
-        report()
+    "end" may be "RACK" to park a piece in the next free capture slot, and
+    "start" may be "RACK" to take "piece" back out of the rack (undo).
+    Each move may also carry "piece" (symbol of the piece being moved).
+    """
+    moves = data.get("moves") or []
+    try:
+        moves = [{"start": m.get("start", "").strip().upper(),
+                  "end": m.get("end", "").strip().upper(),
+                  "piece": m.get("piece")} for m in moves]
+        print(f"[NET] Received move_job: {[(m['start'], m['end']) for m in moves]}")
+        for m in moves:
+            if m["start"] != RACK:
+                location_tiles(m["start"])
+            elif not m["piece"]:
+                raise ValueError("Taking a piece from the rack needs its symbol")
+            if m["end"] != RACK:
+                location_tiles(m["end"])
+    except Exception as e:
+        print(f"[NET ERROR] {e}")
+        _emit_done("move_job", {"moves": data.get("moves"), "status": "error", "message": str(e)})
+        return None
 
-        # Optional: emit ack back to server
-        sio.emit("move_piece_done", {
-            "start": start_sq,
-            "end": end_sq,
-            "capture": capture_flag,
-            "status": "ok",
-        })
+    job = {"moves": moves}
+    if data.get("trace") is not None:
+        job["trace"] = data["trace"]
+        _stamp(job, "pi_received")
+    return _enqueue("move_job", job)
+
+@sio.on("restore_position")
+def on_restore_position(data):
+    """
+    Expected payload shape:
+        { "current": "<FEN of the physical board>", "target": "<FEN to set up>" }
+    """
+    try:
+        current_fen = data.get("current", "")
+        target_fen = data.get("target", "")
+        print(f"[NET] Received restore_position: {current_fen} -> {target_fen}")
+        move_planner.fen_layout(current_fen)
+        move_planner.fen_layout(target_fen)
     except Exception as e:
         print(f"[NET ERROR] {e}")
-        try:
-            sio.emit("move_piece_done", {
-                "start": data.get("start"),
-                "end": data.get("end"),
-                "capture": data.get("capture"),
-                "status": "error",
-                "message": str(e),
-            })
-        except Exception:
-            pass
+        _emit_done("restore_position", {"target": data.get("target"), "status": "error", "message": str(e)})
+        return None
+
+    return _enqueue("restore_position", {"current": current_fen, "target": target_fen})
+
+@sio.on("home")
+def on_home(data=None):
+    """Queue a return to the A1 center (runs after anything already queued)."""
+    print("[NET] Received home")
+    return _enqueue("home", {})
+
+@sio.on("abort")
+def on_abort(data=None):
+    """
+    Drop every queued command and stop the running one within
+    STOP_CHECK_STEPS + STOP_DECEL_STEPS steps (the magnet is released and
+    the position is kept, so no re-homing is needed).
+    """
+    dropped = []
+    with _jobs_lock:
+        while True:
+            try:
+                dropped.append(_jobs.get_nowait())
+            except queue.Empty:
+                break
+        gantry.abort.set()
+    print(f"[NET] Received abort — dropped {len(dropped)} queued job(s)")
+
+    for job_id, kind, payload in dropped:
+        _emit_done(kind, {"job_id": job_id, **payload, "status": "aborted", "message": "Dropped by abort"})
+    return {"dropped": [job_id for job_id, _, _ in dropped]}
 
 def run_socketio_mode():
+    global _worker_started
     print(f"Config: steps/in={STEPS_PER_IN}, steps/tile≈{STEPS_PER_TILE} (tile={TILE_INCHES}\")")
-    print("Assuming carriage is homed at A1 center (0,0).")
+    load_path_cache()
+    load_state()
+    _worker_started = True
+    threading.Thread(target=_motion_worker, daemon=True).start()
+    threading.Thread(target=_progress_reporter, daemon=True).start()
     print(f"[NET] Connecting to Socket.IO server at {SOCKETIO_SERVER_URL} ...")
     sio.connect(SOCKETIO_SERVER_URL)
     print("[NET] Waiting for move commands (event: 'move_piece')...")
@@ -574,6 +1146,8 @@ def run_socketio_mode():
 
 # ----------------------------- Script entry -----------------------------
 if __name__ == "__main__":
+    # Off the Pi: CHESSBOT_DRIVER=sim python3 piece_movement_algorithm.py cli
+    use_driver(os.environ.get("CHESSBOT_DRIVER", "gpio"))
     try:
         # If you want the old terminal behavior:
         #   python3 motor_control_median.py cli
@@ -0,0 +1,88 @@
+import pytest
+import drivers
+import piece_movement_algorithm as pma
+
+@pytest.fixture
+def sim():
+    sim = pma.use_driver(drivers.SimDriver())
+    pma.gantry.x_steps = pma.gantry.y_steps = 0
+    pma.rack_contents.clear()
+    pma.capture_rack.reserved.clear()
+    pma.capture_index = 0
+    pma.gantry.abort.clear()
+    return sim
+
+def carriage_from_motors(sim):
+    # Undo CoreXY (ΔA = ΔX + ΔY, ΔB = ΔX - ΔY) and the DIR inversions
+    a = -sim.net[0] if pma.INVERT_DIR1 else sim.net[0]
+    b = -sim.net[1] if pma.INVERT_DIR2 else sim.net[1]
+    return (a + b) // 2, (a - b) // 2
+
+def test_move_piece(sim):
+    pma.move_piece("E2", "E4")
+    tile = pma.STEPS_PER_TILE
+    assert((pma.gantry.x_steps, pma.gantry.y_steps) == (4 * tile, 3 * tile - round(0.2 * tile)))
+    assert(carriage_from_motors(sim) == (pma.gantry.x_steps, pma.gantry.y_steps))
+    assert(sim.magnet_duty == 0 and sim.magnet_on_s > 0)
+
+def test_magnet_schedule(sim):
+    pma.move_piece("B1", "C3")
+    duties = [duty for _, duty in sim.magnet_log if duty]
+    assert(duties[0] == pma.MAG_DUTY_MOVE)                          # grab at full duty
+    assert(set(duties[1:]) == {pma.MAG_DUTY_HOLD})                  # carry at hold duty
+    assert(sim.magnet_duty_s < sim.magnet_on_s)
+
+def test_capture_parks_piece(sim):
+    pma.capture_then_move_piece("D1", "D7", "p")
+    assert(pma.rack_contents == {"R11": "p"})   # slot level with D7, not the bottom one
+    assert(pma.capture_index == 1)
+
+def test_abort_keeps_position(sim):
+    class AbortingSim(drivers.SimDriver):
+        def step(self, step_a, step_b, step_delay):
+            super().step(step_a, step_b, step_delay)
+            if self.pulses[0] == 300:
+                pma.gantry.abort.set()
+
+    sim = pma.use_driver(AbortingSim())
+    with pytest.raises(pma.MotionAborted):
+        pma.move_piece("A2", "H7")
+    assert(sim.pulses[0] <= 300 + pma.STOP_CHECK_STEPS + pma.STOP_DECEL_STEPS)
+    assert(carriage_from_motors(sim) == (pma.gantry.x_steps, pma.gantry.y_steps))
+
+def test_abort_mid_capture_leaves_rack_empty(sim):
+    class AbortingSim(drivers.SimDriver):
+        def step(self, step_a, step_b, step_delay):
+            super().step(step_a, step_b, step_delay)
+            if self.pulses[0] == 300:
+                pma.gantry.abort.set()
+
+    pma.use_driver(AbortingSim())
+    with pytest.raises(pma.MotionAborted):
+        pma.capture_then_move_piece("A1", "H7", "p")
+    assert(pma.rack_contents == {} and pma.capture_rack.reserved == set())
+
+def test_undo_pulls_piece_from_rack(sim):
+    pma.capture_then_move_piece("D1", "D7", "p")
+    pma._run_move_job({"moves": [{"start": "D7", "end": "D1", "piece": "Q"},
+                                 {"start": "RACK", "end": "D7", "piece": "p"}]})
+    assert(pma.rack_contents == {})
+    assert(carriage_from_motors(sim) == (pma.gantry.x_steps, pma.gantry.y_steps))
+
+def test_sigusr1_mid_dwell_homes_after_the_move(sim, capsys):
+    class SignalledSim(drivers.SimDriver):
+        signalled = False
+        def sleep(self, seconds):
+            super().sleep(seconds)
+            if not self.signalled:          # first corner dwell (carriage not pulsing)
+                self.signalled = True
+                pma._handle_sigusr1(None, None)
+
+    sim = pma.use_driver(SignalledSim())
+    with pytest.raises(pma.MotionAborted):
+        with pma._cli_command():
+            pma.move_piece("E2", "E4")
+    assert("Reached E4" not in capsys.readouterr().out)
+    pma._stop_after_abort()
+    assert((pma.gantry.x_steps, pma.gantry.y_steps) == (0, 0))
+    assert(carriage_from_motors(sim) == (0, 0) and not pma._home_pending)
@@ -0,0 +1,106 @@
+# rack.py — where captured pieces are parked
+# The rack is one or more columns of slots beside the board, each slot a
+# location named "R<index>" (numbered column by column). The Rack object
+# remembers which piece symbol sits in which slot and hands out slots:
+#   • a new capture goes to the free slot closest to the square it is taken
+#     from (shortest carry), not simply the next one up the column
+#   • a slot is free again as soon as its piece is carried out of it
+#   • a job reserves its slots up front and only records a piece in one
+#     once the carry there succeeded, so an aborted job leaves no phantom
+#     pieces behind (release() frees what it did not use)
+#   • find() returns the slot holding a given piece, nearest first, so undo
+#     and resets can pull pieces back out
+# Coordinates are in tiles with A1 center = (0,0); distances are Manhattan
+# because the carriage always travels along X and Y.
+# No GPIO here, so this can be imported (and tested) off the Pi.
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from move_planner import travel_tiles
+
+
+class RackColumn(NamedTuple):
+    side: str        # label only, e.g. "H-side"
+    x: float         # column center (tiles)
+    y0: float        # first slot center (tiles)
+    spacing: float   # slot pitch along Y (tiles)
+    count: int
+
+
+class Rack:
+    def __init__(self, columns: Iterable[RackColumn]):
+        self.columns = list(columns)
+        self.slots: List[Tuple[float, float]] = [
+            (col.x, col.y0 + i * col.spacing) for col in self.columns for i in range(col.count)
+        ]
+        self.contents: Dict[str, Optional[str]] = {}  # slot -> piece symbol (None if unknown)
+        self.reserved: Set[str] = set()  # slots promised to a running job, still empty
+
+    def signature(self) -> str:
+        """Identifies the slot layout (saved state is only valid for the same one)."""
+        return ";".join(f"{c.x}:{c.y0}:{c.spacing}:{c.count}" for c in self.columns)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def slot_tiles(self, slot: str) -> Tuple[float, float]:
+        try:
+            index = int(slot.strip().upper()[1:])
+        except ValueError:
+            raise ValueError(f"Bad location '{slot}'")
+        if index < 0 or index >= len(self.slots):
+            raise ValueError(f"Bad capture slot {index}")
+        return self.slots[index]
+
+    def free_slots(self) -> List[str]:
+        return [f"R{i}" for i in range(len(self.slots)) if not self._taken(f"R{i}")]
+
+    def _taken(self, slot: str) -> bool:
+        return slot in self.contents or slot in self.reserved
+
+    def nearest_free(self, near: Tuple[float, float]) -> Optional[str]:
+        """Free slot closest to `near` (lowest index on ties), or None if the rack is full."""
+        best = None
+        best_d = 0.0
+        for i, xy in enumerate(self.slots):
+            slot = f"R{i}"
+            if self._taken(slot):
+                continue
+            d = travel_tiles(near, xy)
+            if best is None or d < best_d:
+                best, best_d = slot, d
+        return best
+
+    def allocate(self, near: Tuple[float, float], piece: Optional[str] = None) -> str:
+        """Reserve the free slot closest to `near` for `piece`."""
+        slot = self.nearest_free(near)
+        if slot is None:
+            raise RuntimeError("Capture zone is full")
+        self.contents[slot] = piece
+        return slot
+
+    def reserve(self, near: Tuple[float, float]) -> str:
+        """Hold the free slot closest to `near` for a piece not carried there yet."""
+        slot = self.nearest_free(near)
+        if slot is None:
+            raise RuntimeError("Capture zone is full")
+        self.reserved.add(slot)
+        return slot
+
+    def fill(self, slot: str, piece: Optional[str]):
+        """A piece arrived in `slot` (reserved or not)."""
+        self.reserved.discard(slot)
+        self.contents[slot] = piece
+
+    def release(self, slot: str):
+        """Drop a reservation (no-op once the slot was filled)."""
+        self.reserved.discard(slot)
+
+    def find(self, piece: str, near: Tuple[float, float] = (0.0, 0.0),
+             exclude: Iterable[str] = ()) -> Optional[str]:
+        """Slot holding `piece` closest to `near` (skipping `exclude`), or None."""
+        exclude = set(exclude)
+        held = [slot for slot, p in self.contents.items() if p == piece and slot not in exclude]
+        if not held:
+            return None
+        return min(held, key=lambda slot: (travel_tiles(near, self.slot_tiles(slot)), int(slot[1:])))
@@ -0,0 +1,35 @@
+import pytest
+import rack
+
+COLUMNS = [rack.RackColumn("H-side", 8.5, 0.5, 0.5, 4), rack.RackColumn("H-side outer", 9.5, 0.5, 0.5, 4)]
+
+def test_nearest_free_slot():
+    r = rack.Rack(COLUMNS)
+    assert(len(r) == 8 and r.slot_tiles("R5") == (9.5, 1.0))
+    assert(r.allocate((7.0, 2.0), "p") == "R3")      # closest to H3
+    assert(r.allocate((7.0, 2.0), "n") == "R2")
+    assert(r.nearest_free((7.0, 0.0)) == "R0")
+
+def test_full_and_find():
+    r = rack.Rack(COLUMNS[:1])
+    for piece in "pqpn":
+        r.allocate((7.0, 0.0), piece)
+    with pytest.raises(RuntimeError):
+        r.allocate((7.0, 0.0))
+
+    assert(r.find("p", near=(8.5, 2.0)) == "R2")
+    assert(r.find("k") is None)
+    assert(r.find("p", near=(8.5, 2.0), exclude=["R2"]) == "R0")
+    del r.contents["R2"]
+    assert(r.free_slots() == ["R2"] and r.find("p") == "R0")
+
+def test_reserve_fill_release():
+    r = rack.Rack(COLUMNS[:1])
+    a = r.reserve((7.0, 0.0))
+    b = r.reserve((7.0, 0.0))
+    assert((a, b) == ("R0", "R1") and r.contents == {})
+    assert(r.nearest_free((7.0, 0.0)) == "R2")      # reserved slots are not handed out again
+    r.fill(a, "p")
+    r.release(a)
+    r.release(b)
+    assert(r.contents == {"R0": "p"} and r.free_slots() == ["R1", "R2", "R3"])
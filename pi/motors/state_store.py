@@ -0,0 +1,62 @@
+# state_store.py — gantry state that survives a service restart
+# The carriage position and the capture rack only exist in memory, so every
+# restart used to mean a manual re-home and rack cleanup. StateStore keeps a
+# small JSON snapshot on disk instead:
+#   • written to a temp file, fsync'd, then os.replace'd over the old one (and
+#     the directory fsync'd), so a crash or power cut leaves either the old
+#     or the new snapshot, never half of one
+#   • a "moving" flag is saved before a move starts and cleared after it
+#     ends, so a snapshot taken mid-move is recognised as untrustworthy
+#   • a config key (steps per tile etc.) is stored along with it, so a
+#     snapshot from a different calibration is not replayed
+# No GPIO here, so this can be imported (and tested) off the Pi.
+
+import json
+import os
+from typing import Optional
+
+VERSION = 1
+
+
+class StateStore:
+    def __init__(self, path: str, config_key: str):
+        self.path = path
+        self.config_key = config_key
+
+    def save(self, state: dict):
+        """Atomically replace the snapshot with `state` (must be JSON-serialisable)."""
+        data = {"version": VERSION, "config": self.config_key, **state}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+        # Make the rename itself durable
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def load(self) -> Optional[dict]:
+        """
+        The saved state, or None if there is none, it cannot be read, or it
+        was written for a different version / config.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        if data.get("version") != VERSION or data.get("config") != self.config_key:
+            return None
+        return data
@@ -0,0 +1,19 @@
+import state_store
+
+def test_roundtrip(tmp_path):
+    store = state_store.StateStore(str(tmp_path / "state.json"), "210:False")
+    assert(store.load() is None)
+
+    store.save({"x_steps": 840, "y_steps": 588, "rack": {"R0": "p"}, "moving": False})
+    state = store.load()
+    assert((state["x_steps"], state["y_steps"], state["rack"]) == (840, 588, {"R0": "p"}))
+    assert(not (tmp_path / "state.json.tmp").exists())
+
+def test_rejects_other_config_and_garbage(tmp_path):
+    path = str(tmp_path / "state.json")
+    state_store.StateStore(path, "210:False").save({"x_steps": 1})
+    assert(state_store.StateStore(path, "254:True").load() is None)
+
+    with open(path, "w") as f:
+        f.write('{"x_steps": 1')   # torn write
+    assert(state_store.StateStore(path, "210:False").load() is None)
@@ -0,0 +1,159 @@
+# trajectory.py — a move as flat per-pulse buffers
+# Instead of "loop N times and pulse", a move is a Trajectory: one entry per
+# STEP pulse, kept in two arrays so nothing is allocated per step:
+#   • bits      array('B'): which motors pulse and which way they turn
+#                 STEP_A / STEP_B  — motor A / B gets a pulse
+#                 DIR_A  / DIR_B   — motor turns positive (before any DIR pin
+#                                    inversion, which is the gantry's business)
+#   • intervals array('H'): step delay in µs (the STEP pin is HIGH for this
+#                 long, then LOW for this long), so up to 65.5 ms per edge
+# Trajectories concatenate, time-scale and serialize as plain array copies,
+# so planners can build them, caches can store them and the executor
+# (motion.Gantry.move) just walks the two buffers.
+# Motor space is CoreXY: ΔA = ΔX + ΔY, ΔB = ΔX − ΔY.
+# No GPIO here, so this can be imported (and tested) off the Pi.
+
+import array
+import struct
+from typing import Iterator, Optional, Tuple
+
+STEP_A = 0x1
+STEP_B = 0x2
+DIR_A  = 0x4
+DIR_B  = 0x8
+
+MAX_INTERVAL_US = 0xFFFF
+
+_MAGIC = b"TRJ1"
+_HEADER = struct.Struct("<4sI")  # magic, pulse count
+
+
+def _motor_delta(code: int) -> Tuple[int, int]:
+    a = (1 if code & DIR_A else -1) if code & STEP_A else 0
+    b = (1 if code & DIR_B else -1) if code & STEP_B else 0
+    return a, b
+
+_DELTAS = [_motor_delta(code) for code in range(16)]
+
+
+class Trajectory:
+    """Per-pulse step/direction bits and step delays (µs)."""
+
+    __slots__ = ("bits", "intervals")
+
+    def __init__(self, bits: Optional[array.array] = None, intervals: Optional[array.array] = None):
+        self.bits = bits if bits is not None else array.array('B')
+        self.intervals = intervals if intervals is not None else array.array('H')
+        if len(self.bits) != len(self.intervals):
+            raise ValueError("bits and intervals must have the same length")
+
+    @classmethod
+    def line(cls, dx_steps: int, dy_steps: int, interval_us: int,
+             start_us: int = 0, ramp_steps: int = 0) -> "Trajectory":
+        """
+        Straight carriage move at a constant step delay. For pure X or pure Y
+        moves both motors pulse every time (|ΔA| == |ΔB|).
+
+        With ramp_steps > 0 the delay falls linearly from start_us to
+        interval_us over the first ramp_steps pulses and rises back over the
+        last ones (trapezoid; short moves get a shorter ramp each way).
+        """
+        if not 0 < interval_us <= MAX_INTERVAL_US:
+            raise ValueError(f"Step delay {interval_us} µs out of range")
+        dA = dx_steps + dy_steps
+        dB = dx_steps - dy_steps
+        code = ((STEP_A if dA else 0) | (STEP_B if dB else 0)
+                | (DIR_A if dA >= 0 else 0) | (DIR_B if dB >= 0 else 0))
+        n = max(abs(dA), abs(dB))
+        intervals = array.array('H', [interval_us]) * n
+
+        ramp = min(ramp_steps, n // 2) if start_us > interval_us else 0
+        if ramp:
+            if start_us > MAX_INTERVAL_US:
+                raise ValueError(f"Start delay {start_us} µs out of range")
+            up = array.array('H', (start_us - (start_us - interval_us) * i // ramp_steps
+                                   for i in range(ramp)))
+            intervals[:ramp] = up
+            up.reverse()
+            intervals[n - ramp:] = up
+        return cls(array.array('B', [code]) * n, intervals)
+
+    # ---- size / timing ----
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, Trajectory)
+                and self.bits == other.bits and self.intervals == other.intervals)
+
+    def duration_s(self) -> float:
+        """Time to play the whole trajectory (two edges per pulse)."""
+        return 2 * sum(self.intervals) / 1e6
+
+    def motor_steps(self, n: Optional[int] = None) -> Tuple[int, int]:
+        """Net (ΔA, ΔB) of the first n pulses (all of them by default)."""
+        bits = self.bits if n is None or n >= len(self.bits) else self.bits[:n]
+        a = b = 0
+        for code in set(bits):
+            count = bits.count(code)
+            da, db = _DELTAS[code]
+            a += da * count
+            b += db * count
+        return a, b
+
+    def displacement(self, n: Optional[int] = None) -> Tuple[int, int]:
+        """Net carriage (ΔX, ΔY) in steps of the first n pulses."""
+        a, b = self.motor_steps(n)
+        return (a + b) // 2, (a - b) // 2
+
+    # ---- building ----
+    def extend(self, other: "Trajectory") -> "Trajectory":
+        """Append `other` in place; returns self."""
+        self.bits.extend(other.bits)
+        self.intervals.extend(other.intervals)
+        return self
+
+    def __add__(self, other: "Trajectory") -> "Trajectory":
+        return Trajectory(self.bits + other.bits, self.intervals + other.intervals)
+
+    def __iadd__(self, other: "Trajectory") -> "Trajectory":
+        return self.extend(other)
+
+    def scaled(self, factor: float) -> "Trajectory":
+        """Same path, every step delay multiplied by `factor` (>1 is slower)."""
+        if factor <= 0:
+            raise ValueError("Time scale must be positive")
+        intervals = array.array('H', (min(MAX_INTERVAL_US, max(1, int(round(i * factor))))
+                                      for i in self.intervals))
+        return Trajectory(array.array('B', self.bits), intervals)
+
+    # ---- reading ----
+    def runs(self) -> Iterator[Tuple[int, int, int]]:
+        """(bits, interval_us, count) for every run of identical pulses."""
+        bits, intervals = self.bits, self.intervals
+        n = len(bits)
+        i = 0
+        while i < n:
+            code, iv = bits[i], intervals[i]
+            j = i + 1
+            while j < n and bits[j] == code and intervals[j] == iv:
+                j += 1
+            yield code, iv, j - i
+            i = j
+
+    # ---- disk / wire ----
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(_MAGIC, len(self.bits)) + self.bits.tobytes() + self.intervals.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Trajectory":
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated trajectory")
+        magic, n = _HEADER.unpack_from(data)
+        if magic != _MAGIC or len(data) != _HEADER.size + 3 * n:
+            raise ValueError("Not a trajectory (bad header or length)")
+        bits = array.array('B')
+        intervals = array.array('H')
+        bits.frombytes(data[_HEADER.size:_HEADER.size + n])
+        intervals.frombytes(data[_HEADER.size + n:])
+        return cls(bits, intervals)
@@ -0,0 +1,28 @@
+import pytest
+import trajectory as tj
+
+def test_line_displacement():
+    traj = tj.Trajectory.line(0, -300, 3000)
+    assert(len(traj) == 300)
+    assert(traj.motor_steps() == (-300, 300))
+    assert(traj.displacement() == (0, -300))
+    assert(traj.displacement(100) == (0, -100))
+    assert(traj.duration_s() == pytest.approx(1.8))
+
+def test_concat_scale_roundtrip():
+    traj = tj.Trajectory.line(210, 0, 3000) + tj.Trajectory.line(0, 105, 3000)
+    assert(traj.displacement() == (210, 105))
+    assert([count for _, _, count in traj.runs()] == [210, 105])
+
+    slow = traj.scaled(2.0)
+    assert(slow.duration_s() == pytest.approx(2 * traj.duration_s()))
+    assert(slow.bits == traj.bits)
+
+    assert(tj.Trajectory.from_bytes(traj.to_bytes()) == traj)
+    with pytest.raises(ValueError):
+        tj.Trajectory.from_bytes(traj.to_bytes()[:-1])
+
+def test_ramped_line():
+    traj = tj.Trajectory.line(10, 0, 1000, start_us=3000, ramp_steps=4)
+    assert(list(traj.intervals) == [3000, 2500, 2000, 1500, 1000, 1000, 1500, 2000, 2500, 3000])
+    assert(traj.displacement() == (10, 0))